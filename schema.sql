@@ -38,13 +38,27 @@ CREATE TABLE IF NOT EXISTS licitacoes (
 CREATE INDEX IF NOT EXISTS idx_licitacoes_aderencia ON licitacoes(aderencia);
 CREATE INDEX IF NOT EXISTS idx_licitacoes_recomendacao ON licitacoes(recomendacao);
 CREATE INDEX IF NOT EXISTS idx_licitacoes_boletim ON licitacoes(numero_boletim);
-CREATE INDEX IF NOT EXISTS idx_licitacoes_conlicitacao ON licitacoes(numero_conlicitacao);
 CREATE INDEX IF NOT EXISTS idx_licitacoes_created ON licitacoes(created_at DESC);
 
--- Unique constraint para evitar duplicatas
-CREATE UNIQUE INDEX IF NOT EXISTS idx_licitacoes_unique 
-    ON licitacoes(numero_conlicitacao) 
-    WHERE numero_conlicitacao IS NOT NULL AND numero_conlicitacao != '';
+-- Unique constraint para evitar duplicatas (alvo do ON CONFLICT no upsert em lote;
+-- índice parcial não serve ao PostgREST). NULLs não conflitam entre si.
+-- O índice da constraint também atende às buscas por numero_conlicitacao, então o
+-- índice parcial antigo e o índice simples são removidos em bancos já existentes.
+DROP INDEX IF EXISTS idx_licitacoes_unique;
+DROP INDEX IF EXISTS idx_licitacoes_conlicitacao;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'licitacoes_numero_conlicitacao_key'
+    ) THEN
+        -- O índice parcial aceitava vários '' — viram NULL para não violar a constraint
+        UPDATE licitacoes SET numero_conlicitacao = NULL WHERE numero_conlicitacao = '';
+        ALTER TABLE licitacoes
+            ADD CONSTRAINT licitacoes_numero_conlicitacao_key UNIQUE (numero_conlicitacao);
+    END IF;
+END
+$$;
 
 -- Trigger para atualizar updated_at
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -60,6 +74,31 @@ CREATE TRIGGER update_licitacoes_updated_at
     FOR EACH ROW 
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Estatísticas agregadas no servidor (usado por database.get_stats via RPC)
+CREATE OR REPLACE FUNCTION licitacoes_stats(p_days INTEGER DEFAULT 30)
+RETURNS TABLE (
+    total BIGINT,
+    alta BIGINT,
+    media BIGINT,
+    baixa BIGINT,
+    participar BIGINT,
+    acompanhar BIGINT,
+    descartar BIGINT
+) AS $$
+    SELECT
+        COUNT(*),
+        COUNT(*) FILTER (WHERE aderencia = 'ALTA'),
+        COUNT(*) FILTER (WHERE aderencia = 'MEDIA'),
+        COUNT(*) FILTER (WHERE aderencia = 'BAIXA'),
+        COUNT(*) FILTER (WHERE recomendacao = 'PARTICIPAR'),
+        COUNT(*) FILTER (WHERE recomendacao = 'ACOMPANHAR'),
+        COUNT(*) FILTER (WHERE recomendacao = 'DESCARTAR')
+    FROM licitacoes
+    WHERE processado_em > NOW() - make_interval(days => p_days);
+$$ language 'sql' STABLE;
+
+CREATE INDEX IF NOT EXISTS idx_licitacoes_processado ON licitacoes(processado_em DESC);
+
 -- Tabela de log de processamento
 CREATE TABLE IF NOT EXISTS processamento_log (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
@@ -3,15 +3,83 @@ Módulo de análise por IA.
 Usa LLM para gerar resumos, classificar aderência e recomendar ações.
 """
 
+import asyncio
+import functools
+import hashlib
+import itertools
 import json
 import logging
-from openai import AsyncOpenAI
-
-from . import config
+from collections import Counter
+from typing import Literal
+
+import ahocorasick
+import httpx
+import json_repair
+import orjson
+from openai import (
+    AsyncOpenAI,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+from pydantic import BaseModel
+from tenacity import (
+    RetryCallState,
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from . import cache, config
+from .rate_limiter import get_bucket, get_encoding, estimate_tokens
 
 logger = logging.getLogger(__name__)
 
-client = AsyncOpenAI(api_key=config.OPENAI_API_KEY)
+
+@functools.lru_cache(maxsize=1)
+def _client() -> AsyncOpenAI:
+    """
+    Client OpenAI criado sob demanda, já dentro do event loop que vai usá-lo.
+    Um único httpx.AsyncClient com pool grande é compartilhado por todas as chamadas.
+    Retries ficam a cargo do tenacity (_chat_completion), não do SDK.
+    """
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+        timeout=httpx.Timeout(config.OPENAI_TIMEOUT, connect=10.0),
+    )
+    return AsyncOpenAI(api_key=config.OPENAI_API_KEY, http_client=http_client, max_retries=0)
+
+
+async def close_client():
+    """Fecha o client OpenAI (e o pool HTTP), se tiver sido criado."""
+    if _client.cache_info().currsize:
+        await _client().close()
+        _client.cache_clear()
+
+# Limita chamadas simultâneas à OpenAI (respeita o RPM da conta)
+_semaphore = asyncio.Semaphore(config.OPENAI_MAX_CONCURRENCY)
+
+
+def _build_automaton(keywords: tuple[str, ...]) -> ahocorasick.Automaton:
+    """
+    Compila as keywords num autômato Aho-Corasick (busca em uma passada no texto).
+    A chave é a keyword em minúsculas; o valor guarda (posição no catálogo, grafia original)
+    de cada entrada com essa chave, para o resultado sair como no catálogo.
+    """
+    entries: dict[str, list[tuple[int, str]]] = {}
+    for i, kw in enumerate(keywords):
+        entries.setdefault(kw.lower(), []).append((i, kw))
+    automaton = ahocorasick.Automaton()
+    for key, value in entries.items():
+        automaton.add_word(key, tuple(value))
+    automaton.make_automaton()
+    return automaton
+
+
+_AUTOMATON_ALTA = _build_automaton(config.KEYWORDS_ALTA)
+_AUTOMATON_MEDIA = _build_automaton(config.KEYWORDS_MEDIA)
 
 # ── Prompts ───────────────────────────────────────────────────
 
@@ -45,6 +113,8 @@ Analise o edital da licitação e gere um relatório completo.
 
 Responda APENAS com um JSON válido:
 {
+  "aderencia": "ALTA" | "MEDIA" | "BAIXA",
+  "justificativa_aderencia": "Por que esta classificação de aderência",
   "resumo_executivo": "Resumo do edital em até 200 palavras — pontos principais, o que está sendo licitado",
   "objeto_detalhado": "Descrição detalhada do que está sendo comprado/contratado",
   "itens_relevantes": ["lista de itens/lotes que a IndFlow pode atender"],
@@ -57,13 +127,203 @@ Responda APENAS com um JSON válido:
   },
   "valor_estimado": "valor estimado se disponível",
   "garantias": "garantias exigidas se houver",
-  "aderencia": "ALTA" | "MEDIA" | "BAIXA",
-  "justificativa_aderencia": "Por que esta classificação de aderência",
   "recomendacao": "PARTICIPAR" | "ACOMPANHAR" | "DESCARTAR",
   "justificativa_recomendacao": "Por que esta recomendação",
   "alertas": ["pontos de atenção — prazos apertados, exigências difíceis, etc."]
 }"""
 
+PACKED_TRIAGE_INSTRUCTION = (
+    "Classifique cada objeto abaixo. Responda JSON "
+    '{"results":[{"idx": <número entre colchetes>, "aderencia": "ALTA" | "MEDIA" | "BAIXA", '
+    '"motivo": "justificativa breve", "keywords_match": ["palavras que casaram"]}, ...]}'
+)
+
+
+# ── Schemas de resposta (Structured Outputs) ──
+# A OpenAI garante conformidade com o schema no servidor; a resposta já chega tipada.
+
+Aderencia = Literal["ALTA", "MEDIA", "BAIXA"]
+
+
+class TriageResult(BaseModel):
+    aderencia: Aderencia
+    motivo: str
+    keywords_match: list[str]
+
+
+class PackedTriageItem(TriageResult):
+    idx: int
+
+
+class PackedTriageResult(BaseModel):
+    results: list[PackedTriageItem]
+
+
+class Prazos(BaseModel):
+    abertura: str
+    proposta: str
+    execucao: str
+
+
+class EditalAnalysis(BaseModel):
+    # Aderência primeiro: no streaming ela chega antes do restante do relatório
+    aderencia: Aderencia
+    justificativa_aderencia: str
+    resumo_executivo: str
+    objeto_detalhado: str
+    itens_relevantes: list[str]
+    exigencias_tecnicas: list[str]
+    documentacao_necessaria: list[str]
+    prazos: Prazos
+    valor_estimado: str
+    garantias: str
+    recomendacao: Literal["PARTICIPAR", "ACOMPANHAR", "DESCARTAR"]
+    justificativa_recomendacao: str
+    alertas: list[str]
+
+
+# Incrementar ao mudar o formato esperado das respostas (invalida o cache)
+PROMPT_VERSION = "2"
+
+
+def _cache_namespace(kind: str, model: str, system_prompt: str) -> str:
+    """Namespace do cache: muda junto com modelo, versão ou texto do prompt."""
+    prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:12]
+    return f"{kind}:v{PROMPT_VERSION}:{model}:{prompt_hash}"
+
+
+_TRIAGE_CACHE_NS = _cache_namespace("triage", config.OPENAI_MODEL_TRIAGE, SYSTEM_PROMPT_TRIAGE)
+_ANALYSIS_CACHE_NS = _cache_namespace("analysis", config.OPENAI_MODEL_ANALYSIS, SYSTEM_PROMPT_ANALYSIS)
+
+
+def _log_retry(retry_state: RetryCallState):
+    """Loga cada nova tentativa de chamada à OpenAI."""
+    logger.warning(
+        f"[AI] Tentativa {retry_state.attempt_number} falhou "
+        f"({retry_state.outcome.exception()!r}); repetindo em {retry_state.next_action.sleep:.1f}s"
+    )
+
+
+@retry(
+    wait=wait_random_exponential(min=1, max=60),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception_type(
+        (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+    ),
+    before_sleep=_log_retry,
+    reraise=True,
+)
+async def _chat_completion(**body):
+    """
+    Chamada ao chat completions com throttling e retry.
+    Erros transitórios (429, 5xx, rede) são repetidos com backoff exponencial + jitter.
+    Se response_format for um modelo pydantic, usa Structured Outputs (.parse).
+    """
+    await get_bucket(body["model"]).acquire(
+        estimate_tokens(body["model"], body["messages"], body.get("max_tokens", 0))
+    )
+    response_format = body.get("response_format")
+    if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+        return await _client().beta.chat.completions.parse(**body)
+    return await _client().chat.completions.create(**body)
+
+
+async def _stream_completion(**body) -> dict:
+    """
+    Chat completions em streaming com Structured Outputs.
+    Com ANALYSIS_ABORT_ON_BAIXA o stream é interrompido assim que a aderência
+    BAIXA e sua justificativa chegam (resultado marcado com analise_parcial).
+    """
+    await get_bucket(body["model"]).acquire(
+        estimate_tokens(body["model"], body["messages"], body.get("max_tokens", 0))
+    )
+    async with _client().beta.chat.completions.stream(**body) as stream:
+        async for event in stream:
+            if event.type != "content.delta" or not isinstance(event.parsed, dict):
+                continue
+            partial = event.parsed
+            if (
+                config.ANALYSIS_ABORT_ON_BAIXA
+                and partial.get("aderencia") == "BAIXA"
+                and "justificativa_aderencia" in partial
+            ):
+                logger.info("[AI] Aderência BAIXA na análise — stream interrompido")
+                return {**partial, "analise_parcial": True}
+
+        return _parsed(await stream.get_final_completion()).model_dump()
+
+
+def _parsed(response) -> BaseModel:
+    """Objeto tipado de uma resposta de Structured Outputs (recusa do modelo vira erro)."""
+    message = response.choices[0].message
+    if message.parsed is None:
+        raise ValueError(f"Modelo recusou a resposta: {message.refusal}")
+    return message.parsed
+
+
+def _parse_json(content: str) -> dict:
+    """
+    Parse do JSON devolvido pela LLM via orjson.
+    JSON malformado (vírgula sobrando, aspas sem escape) é reparado com json_repair
+    em vez de descartar a resposta.
+    """
+    try:
+        result = orjson.loads(content)
+    except orjson.JSONDecodeError:
+        logger.warning("[AI] JSON inválido na resposta, tentando reparar...")
+        result = json_repair.loads(content)
+    if not isinstance(result, dict):
+        raise ValueError("Resposta da IA não é um objeto JSON")
+    return result
+
+
+async def _embed(text: str) -> list[float]:
+    """Embedding do texto (usado pela camada semântica do cache)."""
+    response = await _client().embeddings.create(model=config.OPENAI_MODEL_EMBEDDING, input=text)
+    return response.data[0].embedding
+
+
+def _truncate_tokens(text: str, budget: int, model: str) -> str:
+    """
+    Limita o texto a budget tokens mantendo início e fim (resumo e prazos
+    costumam ficar nas pontas do edital) e descartando o miolo.
+    """
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text)
+    if len(tokens) <= budget:
+        return text
+
+    logger.info(f"[AI] Edital truncado: {len(tokens)} -> {budget} tokens")
+    head = encoding.decode(tokens[: budget * 2 // 3])
+    tail = encoding.decode(tokens[-(budget // 3):])
+    return f"{head}\n\n[...trecho omitido...]\n\n{tail}"
+
+
+def _triage_request_body(objeto: str, palavras_chave: str = "") -> dict:
+    """Monta o corpo da requisição de triagem (usado no modo síncrono e no Batch API)."""
+    user_message = f"OBJETO: {objeto}"
+    if palavras_chave:
+        user_message += f"\nPALAVRAS-CHAVE: {palavras_chave}"
+
+    # Conteúdo estático (catálogo) no system e o variável só no user: o prefixo
+    # idêntico entre chamadas é elegível ao prompt caching automático da OpenAI
+    return {
+        "model": config.OPENAI_MODEL_TRIAGE,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT_TRIAGE},
+            {"role": "user", "content": user_message},
+        ],
+        "temperature": 0.1,
+        # A resposta da triagem tem ~60 tokens; o teto também reduz a reserva no TPM
+        "max_tokens": 120,
+        "response_format": TriageResult,
+    }
+
+
+def _triage_cache_text(objeto: str, palavras_chave: str = "") -> str:
+    """Texto-chave da triagem no cache (compartilhado entre triagem individual e agrupada)."""
+    return f"{objeto}\n{palavras_chave}"
+
 
 async def triage_licitacao(objeto: str, palavras_chave: str = "") -> dict:
     """
@@ -75,30 +335,25 @@ async def triage_licitacao(objeto: str, palavras_chave: str = "") -> dict:
         palavras_chave: Palavras-chave encontradas no edital
     Returns: Dict com aderência, motivo e keywords
     """
-    try:
-        user_message = f"OBJETO: {objeto}"
-        if palavras_chave:
-            user_message += f"\nPALAVRAS-CHAVE: {palavras_chave}"
-
-        response = await client.chat.completions.create(
-            model=config.OPENAI_MODEL_TRIAGE,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT_TRIAGE},
-                {"role": "user", "content": user_message},
-            ],
-            temperature=0.1,
-            max_tokens=300,
-            response_format={"type": "json_object"},
-        )
-
-        result = json.loads(response.choices[0].message.content)
-        logger.info(f"[AI] Triagem: {result.get('aderencia', '?')} - {objeto[:80]}...")
-        return result
-
-    except Exception as e:
-        logger.error(f"[ERR] Erro na triagem: {e}")
-        # Fallback: classificação por keywords
-        return _keyword_fallback_triage(objeto, palavras_chave)
+    async with _semaphore:
+        try:
+            async def compute():
+                response = await _chat_completion(**_triage_request_body(objeto, palavras_chave))
+                return _parsed(response).model_dump()
+
+            result = await cache.get_or_compute(
+                _TRIAGE_CACHE_NS,
+                _triage_cache_text(objeto, palavras_chave),
+                compute,
+                embed_fn=_embed,
+            )
+            logger.info(f"[AI] Triagem: {result['aderencia']} - {objeto[:80]}...")
+            return result
+
+        except Exception as e:
+            logger.error(f"[ERR] Erro na triagem: {e}")
+            # Fallback: classificação por keywords
+            return _keyword_fallback_triage(objeto, palavras_chave)
 
 
 async def analyze_edital(
@@ -119,6 +374,7 @@ async def analyze_edital(
     Returns: Dict com análise completa
     """
     try:
+        edital_text = _truncate_tokens(edital_text, config.MAX_EDITAL_TOKENS, config.OPENAI_MODEL_ANALYSIS)
         user_message = f"""OBJETO: {objeto}
 ÓRGÃO: {orgao}
 CIDADE/UF: {cidade_uf}
@@ -126,19 +382,32 @@ CIDADE/UF: {cidade_uf}
 TEXTO DO EDITAL:
 {edital_text}"""
 
-        response = await client.chat.completions.create(
-            model=config.OPENAI_MODEL_ANALYSIS,
-            messages=[
+        body = {
+            "model": config.OPENAI_MODEL_ANALYSIS,
+            "messages": [
                 {"role": "system", "content": SYSTEM_PROMPT_ANALYSIS},
                 {"role": "user", "content": user_message},
             ],
-            temperature=0.2,
-            max_tokens=2000,
-            response_format={"type": "json_object"},
-        )
+            "temperature": 0.2,
+            "max_tokens": 2000,
+            "response_format": EditalAnalysis,
+        }
 
-        result = json.loads(response.choices[0].message.content)
-        logger.info(f"[OK] Analise completa: {result.get('aderencia', '?')} - {objeto[:80]}...")
+        async def compute():
+            if config.ANALYSIS_STREAM:
+                try:
+                    return await _stream_completion(**body)
+                except Exception as e:
+                    logger.warning(f"[AI] Falha no streaming da análise, repetindo sem stream: {e}")
+            return _parsed(await _chat_completion(**body)).model_dump()
+
+        # Editais longos não têm vizinhança semântica útil — só cache exato.
+        # Análise interrompida no stream (sem recomendação/resumo) não é gravada.
+        result = await cache.get_or_compute(
+            _ANALYSIS_CACHE_NS, user_message, compute,
+            cacheable=lambda r: not r.get("analise_parcial"),
+        )
+        logger.info(f"[OK] Analise completa: {result['aderencia']} - {objeto[:80]}...")
         return result
 
     except Exception as e:
@@ -151,31 +420,170 @@ TEXTO DO EDITAL:
         }
 
 
-async def batch_triage(licitacoes: list[dict]) -> list[dict]:
+async def batch_triage(licitacoes: list[dict]) -> tuple[list[dict], Counter]:
     """
     Executa triagem em lote para todas as licitações de um boletim.
     
     Args:
         licitacoes: Lista de dicts com pelo menos 'objeto'
-    Returns: Lista de dicts com resultado de triagem adicionado
+    Returns: (licitações com resultado de triagem adicionado, contagem por aderência)
+    """
+    # Agrupa TRIAGE_PACK_SIZE objetos por chamada e dispara os grupos em paralelo
+    chunks = list(_chunks(licitacoes, config.TRIAGE_PACK_SIZE))
+    packed = await asyncio.gather(*(triage_batch_packed(c) for c in chunks), return_exceptions=True)
+
+    triages = []
+    for chunk, result in zip(chunks, packed):
+        triages.extend([result] * len(chunk) if isinstance(result, Exception) else result)
+    return _apply_triages(licitacoes, triages)
+
+
+async def triage_batch_packed(items: list[dict]) -> list[dict]:
+    """
+    Triagem de vários objetos numa única chamada ao GPT-4o-mini.
+    O system prompt é pago uma vez por grupo em vez de uma vez por licitação.
+    Itens sem resposta no JSON caem na triagem individual.
+
+    Args:
+        items: Lista de dicts com pelo menos 'objeto'
+    Returns: Lista de resultados de triagem, na mesma ordem de items
+    """
+    keys = [_triage_cache_text(x.get("objeto", ""), x.get("palavras_chave", "")) for x in items]
+    results = [cache.lookup(_TRIAGE_CACHE_NS, k) for k in keys]
+    pending = [i for i, r in enumerate(results) if r is None]
+
+    if pending:
+        async with _semaphore:
+            try:
+                user_message = PACKED_TRIAGE_INSTRUCTION + "\n\n" + "\n".join(
+                    f"[{n}] OBJETO: {items[i].get('objeto', '')} | PALAVRAS: {items[i].get('palavras_chave', '')}"
+                    for n, i in enumerate(pending)
+                )
+                response = await _chat_completion(
+                    model=config.OPENAI_MODEL_TRIAGE,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT_TRIAGE},
+                        {"role": "user", "content": user_message},
+                    ],
+                    temperature=0.1,
+                    max_tokens=100 * len(pending) + 50,
+                    response_format=PackedTriageResult,
+                )
+                for r in _parsed(response).results:
+                    if 0 <= r.idx < len(pending):
+                        i = pending[r.idx]
+                        results[i] = r.model_dump(exclude={"idx"})
+                        cache.store(_TRIAGE_CACHE_NS, keys[i], results[i])
+                logger.info(f"[AI] Triagem agrupada: {len(pending)} objetos em 1 chamada")
+            except Exception as e:
+                logger.error(f"[ERR] Erro na triagem agrupada, usando triagem individual: {e}")
+
+    # Fora do semáforo: a triagem individual adquire o seu próprio slot
+    missing = [i for i, r in enumerate(results) if r is None]
+    fallback = await asyncio.gather(*(
+        triage_licitacao(items[i].get("objeto", ""), items[i].get("palavras_chave", ""))
+        for i in missing
+    ))
+    for i, r in zip(missing, fallback):
+        results[i] = r
+    return results
+
+
+def _chunks(items: list, size: int):
+    """Divide items em grupos de até size elementos."""
+    it = iter(items)
+    while chunk := list(itertools.islice(it, size)):
+        yield chunk
+
+
+async def batch_triage_via_batch_api(licitacoes: list[dict]) -> tuple[list[dict], Counter]:
+    """
+    Triagem em lote via OpenAI Batch API (/v1/batches).
+    Custo ~50% menor e não consome o RPM síncrono, em troca de latência
+    (minutos a horas). Licitações sem resposta caem no fallback por keywords.
+
+    Args:
+        licitacoes: Lista de dicts com pelo menos 'objeto'
+    Returns: (licitações com resultado de triagem adicionado, contagem por aderência)
     """
-    results = []
-    for lic in licitacoes:
-        triage = await triage_licitacao(
-            objeto=lic.get("objeto", ""),
-            palavras_chave=lic.get("palavras_chave", ""),
+    if not licitacoes:
+        return licitacoes, Counter()
+
+    try:
+        lines = []
+        for i, lic in enumerate(licitacoes):
+            body = _triage_request_body(lic.get("objeto", ""), lic.get("palavras_chave", ""))
+            # O arquivo do batch é JSON puro; a conformidade é validada na leitura
+            body["response_format"] = {"type": "json_object"}
+            lines.append(json.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": body,
+            }, ensure_ascii=False))
+        batch_file = await _client().files.create(
+            file=("triagem.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch",
         )
-        lic["triage"] = triage
-        lic["aderencia"] = triage.get("aderencia", "BAIXA")
-        results.append(lic)
+        batch = await _client().batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        logger.info(f"[AI] Batch {batch.id} criado com {len(lines)} triagens")
+
+        # Aguardar conclusão do batch
+        elapsed = 0
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            if elapsed >= config.OPENAI_BATCH_TIMEOUT:
+                await _client().batches.cancel(batch.id)
+                raise TimeoutError(f"Batch {batch.id} não concluiu em {config.OPENAI_BATCH_TIMEOUT}s")
+            await asyncio.sleep(config.OPENAI_BATCH_POLL_INTERVAL)
+            elapsed += config.OPENAI_BATCH_POLL_INTERVAL
+            batch = await _client().batches.retrieve(batch.id)
+
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"Batch {batch.id} terminou com status '{batch.status}'")
+
+        # Ler resultados e casar pelo custom_id
+        output = await _client().files.content(batch.output_file_id)
+        by_id = {}
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            item = orjson.loads(line)
+            response = item.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            content = response["body"]["choices"][0]["message"]["content"]
+            try:
+                by_id[item["custom_id"]] = TriageResult.model_validate(_parse_json(content)).model_dump()
+            except ValueError as e:
+                logger.warning(f"[AI] Resposta inválida no batch ({item['custom_id']}): {e}")
+
+        logger.info(f"[AI] Batch {batch.id} concluído: {len(by_id)}/{len(licitacoes)} respostas")
+        triages = [by_id.get(str(i), RuntimeError("sem resposta no batch")) for i in range(len(licitacoes))]
+
+    except Exception as e:
+        logger.error(f"[ERR] Erro no Batch API, usando triagem síncrona: {e}")
+        return await batch_triage(licitacoes)
 
-    # Contagem por aderência
-    counts = {"ALTA": 0, "MEDIA": 0, "BAIXA": 0}
-    for r in results:
-        counts[r.get("aderencia", "BAIXA")] += 1
+    return _apply_triages(licitacoes, triages)
+
+
+def _apply_triages(licitacoes: list[dict], triages: list) -> tuple[list[dict], Counter]:
+    """Aplica os resultados de triagem às licitações e devolve a contagem por aderência."""
+    counts = Counter()
+    for lic, triage in zip(licitacoes, triages):
+        if isinstance(triage, Exception):
+            logger.error(f"[ERR] Erro na triagem em lote: {triage}")
+            triage = _keyword_fallback_triage(lic.get("objeto", ""), lic.get("palavras_chave", ""))
+        lic["triage"] = triage
+        lic["aderencia"] = triage["aderencia"]
+        counts[lic["aderencia"]] += 1
     logger.info(f"[AI] Triagem em lote: ALTA={counts['ALTA']}, MEDIA={counts['MEDIA']}, BAIXA={counts['BAIXA']}")
 
-    return results
+    return licitacoes, counts
 
 
 def _keyword_fallback_triage(objeto: str, palavras_chave: str = "") -> dict:
@@ -184,8 +592,9 @@ def _keyword_fallback_triage(objeto: str, palavras_chave: str = "") -> dict:
     """
     text = f"{objeto} {palavras_chave}".lower()
 
-    matched_alta = [kw for kw in config.KEYWORDS_ALTA if kw.lower() in text]
-    matched_media = [kw for kw in config.KEYWORDS_MEDIA if kw.lower() in text]
+    matched_alta = _match_keywords(_AUTOMATON_ALTA, text)
+    # MEDIA só é consultado se não houver match de ALTA
+    matched_media = [] if matched_alta else _match_keywords(_AUTOMATON_MEDIA, text)
 
     if matched_alta:
         return {
@@ -205,3 +614,9 @@ def _keyword_fallback_triage(objeto: str, palavras_chave: str = "") -> dict:
             "motivo": "Sem match com produtos ou setores da IndFlow",
             "keywords_match": [],
         }
+
+
+def _match_keywords(automaton: ahocorasick.Automaton, text: str) -> list[str]:
+    """Keywords do catálogo presentes no texto (já em minúsculas), na ordem e grafia do catálogo."""
+    hits = {entry for _, value in automaton.iter(text) for entry in value}
+    return [kw for _, kw in sorted(hits)]
@@ -7,10 +7,16 @@ import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 import uvicorn
 
 from .pipeline import process_boletim, extract_boletim_number_from_subject
+from .analyzer import close_client as close_openai_client
+from .database import close_client as close_database_client
+from .pdf_parser import shutdown_pool as shutdown_pdf_pool
+from .browser_pool import shutdown as shutdown_browser_pool
+from .whatsapp import close_client as close_whatsapp_client
 from . import config
 
 # ── Logging ───────────────────────────────────────────────────
@@ -32,6 +38,7 @@ class BoletimRequest(BaseModel):
     boletim_url: str | None = Field(None, description="URL do boletim (opcional)")
     download_editais: bool = Field(True, description="Baixar editais de Alta aderência")
     send_whatsapp: bool = Field(True, description="Enviar relatório via WhatsApp")
+    use_batch_api: bool = Field(False, description="Triagem via OpenAI Batch API (mais barata, pode levar minutos)")
 
 
 class BoletimResponse(BaseModel):
@@ -47,12 +54,6 @@ class BoletimResponse(BaseModel):
     errors: list[str] = []
 
 
-class HealthResponse(BaseModel):
-    """Health check response."""
-    status: str
-    version: str
-
-
 # ── App ───────────────────────────────────────────────────────
 
 def validate_config():
@@ -82,8 +83,14 @@ async def lifespan(app: FastAPI):
     """Startup e shutdown do app."""
     logger.info("🚀 Servidor de Triagem de Licitações iniciando...")
     validate_config()
+    config.ensure_dirs()
     yield
     logger.info("👋 Servidor encerrando...")
+    await close_openai_client()
+    await close_database_client()
+    await close_whatsapp_client()
+    await shutdown_browser_pool()
+    shutdown_pdf_pool()
 
 
 app = FastAPI(
@@ -91,15 +98,16 @@ app = FastAPI(
     description="API para processar boletins do ConLicitação automaticamente",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 
 # ── Endpoints ─────────────────────────────────────────────────
 
-@app.get("/health", response_model=HealthResponse)
+@app.get("/health")
 async def health_check():
     """Health check endpoint para monitoramento."""
-    return HealthResponse(status="ok", version="1.0.0")
+    return ORJSONResponse({"status": "ok", "version": "1.0.0"})
 
 
 @app.post("/process", response_model=BoletimResponse)
@@ -120,9 +128,12 @@ async def process_boletim_endpoint(request: BoletimRequest):
             email_html=request.email_html,
             download_all_alta=request.download_editais,
             send_whatsapp=request.send_whatsapp,
+            use_batch_api=request.use_batch_api,
         )
 
-        return BoletimResponse(
+        # Resposta montada pelo pipeline (confiável): model_construct pula a validação
+        # e o ORJSONResponse devolvido direto evita a revalidação do response_model
+        response = BoletimResponse.model_construct(
             success=result["success"],
             boletim_number=result.get("boletim_number"),
             total_licitacoes=result.get("total_licitacoes", 0),
@@ -133,6 +144,7 @@ async def process_boletim_endpoint(request: BoletimRequest):
             whatsapp_enviado=result.get("whatsapp_enviado", False),
             errors=result.get("errors", []),
         )
+        return ORJSONResponse(response.model_dump())
 
     except Exception as e:
         logger.error(f"❌ Erro no endpoint /process: {e}", exc_info=True)
@@ -158,11 +170,11 @@ async def process_boletim_async(
         request=request,
     )
 
-    return {
+    return ORJSONResponse({
         "status": "accepted",
         "message": f"Processamento do boletim {boletim_number or 'novo'} iniciado em background",
         "boletim_number": boletim_number,
-    }
+    })
 
 
 async def _run_pipeline_background(request: BoletimRequest):
@@ -175,6 +187,7 @@ async def _run_pipeline_background(request: BoletimRequest):
             email_html=request.email_html,
             download_all_alta=request.download_editais,
             send_whatsapp=request.send_whatsapp,
+            use_batch_api=request.use_batch_api,
         )
     except Exception as e:
         logger.error(f"❌ Erro no pipeline em background: {e}", exc_info=True)
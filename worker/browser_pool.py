@@ -0,0 +1,78 @@
+"""
+Browser compartilhado entre scrapers.
+Um único Chromium (e um único driver Playwright) por processo; cada scraper abre
+o próprio BrowserContext sobre ele. Com BROWSER_CDP_URL, conecta via CDP a um
+Chromium externo (ex: container browserless) em vez de lançar um local.
+"""
+
+import asyncio
+import logging
+
+from playwright.async_api import async_playwright, Browser, Playwright
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+LAUNCH_ARGS = [
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-blink-features=AutomationControlled",
+    # Menos memória/CPU com vários contextos no mesmo host
+    "--disable-gpu",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--disable-default-apps",
+    "--disable-renderer-backgrounding",
+    "--disable-backgrounding-occluded-windows",
+    "--no-first-run",
+    "--mute-audio",
+]
+if config.BLOCK_IMAGES:
+    LAUNCH_ARGS.append("--blink-settings=imagesEnabled=false")
+
+_playwright: Playwright | None = None
+_browser: Browser | None = None
+_lock = asyncio.Lock()
+
+# Limita quantos scrapers (contextos principais) usam o browser ao mesmo tempo
+_slots = asyncio.Semaphore(config.BROWSER_POOL_SIZE)
+
+
+async def get_browser() -> Browser:
+    """Retorna o browser compartilhado, lançando (ou reconectando) sob demanda."""
+    global _playwright, _browser
+    async with _lock:
+        if _browser is None or not _browser.is_connected():
+            if _playwright is None:
+                _playwright = await async_playwright().start()
+            if config.BROWSER_CDP_URL:
+                _browser = await _playwright.chromium.connect_over_cdp(config.BROWSER_CDP_URL)
+                logger.info(f"[BROWSER] Conectado via CDP: {config.BROWSER_CDP_URL}")
+            else:
+                _browser = await _playwright.chromium.launch(headless=True, args=LAUNCH_ARGS)
+                logger.info("[BROWSER] Chromium compartilhado iniciado")
+    return _browser
+
+
+async def acquire():
+    """Reserva uma vaga no pool (bloqueia se BROWSER_POOL_SIZE scrapers já estiverem ativos)."""
+    await _slots.acquire()
+
+
+def release():
+    """Libera a vaga reservada por acquire()."""
+    _slots.release()
+
+
+async def shutdown():
+    """Fecha o browser e o driver Playwright (chamado no shutdown do app)."""
+    global _playwright, _browser
+    async with _lock:
+        if _browser is not None:
+            await _browser.close()
+            _browser = None
+        if _playwright is not None:
+            await _playwright.stop()
+            _playwright = None
+            logger.info("[BROWSER] Chromium compartilhado encerrado")
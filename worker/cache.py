@@ -0,0 +1,122 @@
+"""
+Cache de respostas da IA.
+Camada exata em disco (hash do prompt) + camada semântica em memória
+(similaridade de cosseno entre embeddings), para não pagar a LLM em repetições.
+"""
+
+import hashlib
+import logging
+from collections.abc import Awaitable, Callable
+
+import diskcache
+import numpy as np
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+_exact: diskcache.Cache | None = None
+
+
+def _get_exact() -> diskcache.Cache:
+    """Retorna o cache em disco (singleton)."""
+    global _exact
+    if _exact is None:
+        _exact = diskcache.Cache(config.CACHE_DIR)
+    return _exact
+
+
+class _SemanticIndex:
+    """
+    Índice de produto interno sobre vetores normalizados (busca exaustiva).
+    Buffer circular pré-alocado (max_items x dim): inserir é O(dim), sem recopiar a matriz;
+    cheio, o vetor novo sobrescreve o mais antigo.
+    """
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._vectors: np.ndarray | None = None  # Alocado na primeira inserção (dim do embedder)
+        self._values: list[dict | None] = [None] * max_items
+        self._count = 0   # Posições ocupadas
+        self._cursor = 0  # Próxima posição a escrever
+
+    def search(self, vector: np.ndarray) -> tuple[float, dict | None]:
+        """Retorna (similaridade, valor) do vizinho mais próximo."""
+        if self._count == 0:
+            return 0.0, None
+        sims = self._vectors[: self._count] @ vector
+        best = int(np.argmax(sims))
+        return float(sims[best]), self._values[best]
+
+    def add(self, vector: np.ndarray, value: dict):
+        """Adiciona um vetor; acima de max_items substitui o mais antigo."""
+        if self._vectors is None:
+            self._vectors = np.empty((self.max_items, vector.shape[0]), dtype=np.float32)
+        self._vectors[self._cursor] = vector
+        self._values[self._cursor] = value
+        self._cursor = (self._cursor + 1) % self.max_items
+        self._count = min(self._count + 1, self.max_items)
+
+
+_semantic: dict[str, _SemanticIndex] = {}
+
+
+def _key(namespace: str, key_text: str) -> str:
+    return hashlib.sha256(f"{namespace}\x1f{key_text}".encode("utf-8")).hexdigest()
+
+
+def lookup(namespace: str, key_text: str) -> dict | None:
+    """Consulta apenas a camada exata."""
+    return _get_exact().get(_key(namespace, key_text))
+
+
+def store(namespace: str, key_text: str, value: dict):
+    """Grava na camada exata."""
+    _get_exact().set(_key(namespace, key_text), value, expire=config.CACHE_TTL)
+
+
+async def get_or_compute(
+    namespace: str,
+    key_text: str,
+    compute_fn: Callable[[], Awaitable[dict]],
+    embed_fn: Callable[[str], Awaitable[list[float]]] | None = None,
+    cacheable: Callable[[dict], bool] | None = None,
+) -> dict:
+    """
+    Retorna o valor cacheado para key_text ou calcula via compute_fn.
+
+    Args:
+        namespace: Identifica modelo + versão do prompt (mudou → cache invalidado)
+        key_text: Texto variável da chamada (objeto, palavras-chave, edital...)
+        compute_fn: Coroutine que chama a LLM em caso de miss
+        embed_fn: Se informado, habilita a camada semântica usando este embedder
+        cacheable: Se informado, só grava o valor calculado quando cacheable(valor) é True
+    Returns: Resultado (do cache ou recém-calculado)
+    """
+    value = lookup(namespace, key_text)
+    if value is not None:
+        logger.info(f"[CACHE] Hit exato ({namespace})")
+        return value
+
+    vector = None
+    if embed_fn and config.CACHE_SEMANTIC_ENABLED:
+        try:
+            vector = np.asarray(await embed_fn(key_text), dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+            index = _semantic.setdefault(namespace, _SemanticIndex(config.CACHE_SEMANTIC_MAX_ITEMS))
+            sim, value = index.search(vector)
+            if value is not None and sim >= config.CACHE_SEMANTIC_THRESHOLD:
+                logger.info(f"[CACHE] Hit semântico ({namespace}, sim={sim:.3f})")
+                store(namespace, key_text, value)
+                return value
+        except Exception as e:
+            logger.warning(f"[CACHE] Camada semântica indisponível: {e}")
+            vector = None
+
+    value = await compute_fn()
+    if cacheable is not None and not cacheable(value):
+        return value
+    store(namespace, key_text, value)
+    if vector is not None:
+        _semantic[namespace].add(vector, value)
+    return value
@@ -17,16 +17,43 @@ CONLICITACAO_PASSWORD = os.getenv("CONLICITACAO_PASSWORD", "")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL_TRIAGE = "gpt-4o-mini"       # Pré-triagem rápida
 OPENAI_MODEL_ANALYSIS = "gpt-4o"           # Análise profunda (Alta aderência)
+OPENAI_MODEL_EMBEDDING = "text-embedding-3-small"  # Cache semântico
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "10"))  # Chamadas simultâneas à API
+OPENAI_TIMEOUT = 120.0                     # Timeout de leitura das chamadas (segundos)
+TRIAGE_PACK_SIZE = 20                      # Objetos por chamada na triagem agrupada
+MAX_EDITAL_TOKENS = 12000                  # Orçamento de tokens do edital enviado à análise (início + fim)
+ANALYSIS_STREAM = os.getenv("ANALYSIS_STREAM", "true").lower() == "true"  # Análise profunda via streaming
+ANALYSIS_ABORT_ON_BAIXA = os.getenv("ANALYSIS_ABORT_ON_BAIXA", "false").lower() == "true"  # Interrompe o stream se a aderência vier BAIXA
+OPENAI_BATCH_POLL_INTERVAL = 30            # Intervalo de polling do Batch API (segundos)
+OPENAI_BATCH_TIMEOUT = int(os.getenv("OPENAI_BATCH_TIMEOUT", "3600"))  # Espera máxima pelo Batch API (segundos)
+
+# Limites da conta por modelo: (requisições/min, tokens/min)
+OPENAI_RATE_LIMITS = {
+    OPENAI_MODEL_TRIAGE: (
+        int(os.getenv("OPENAI_TRIAGE_RPM", "500")),
+        int(os.getenv("OPENAI_TRIAGE_TPM", "200000")),
+    ),
+    OPENAI_MODEL_ANALYSIS: (
+        int(os.getenv("OPENAI_ANALYSIS_RPM", "500")),
+        int(os.getenv("OPENAI_ANALYSIS_TPM", "30000")),
+    ),
+}
+OPENAI_RATE_LIMITS_DEFAULT = (500, 30000)
 
 # ── Supabase ──────────────────────────────────────────────────
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
+SUPABASE_MAX_CONCURRENCY = 20             # Requisições simultâneas ao PostgREST (fallback individual)
+DUPLICATE_CACHE_MAX_ITEMS = 10000         # Chaves de duplicata mantidas em memória
+DUPLICATE_CACHE_TTL = 3600                # Validade de cada chave (segundos)
+DUPLICATE_BATCH_SIZE = 200                # Valores por consulta in.(...) na checagem em lote
 
 # ── Evolution API (WhatsApp) ──────────────────────────────────
 EVOLUTION_API_URL = os.getenv("EVOLUTION_API_URL", "http://localhost:8080")
 EVOLUTION_API_KEY = os.getenv("EVOLUTION_API_KEY", "")
 EVOLUTION_INSTANCE = os.getenv("EVOLUTION_INSTANCE", "indflow")
 WHATSAPP_RECIPIENT = os.getenv("WHATSAPP_RECIPIENT", "")
+WHATSAPP_MAX_MEDIA_BYTES = int(os.getenv("WHATSAPP_MAX_MEDIA_BYTES", str(100 * 1024 * 1024)))  # Maior documento aceito pelo WhatsApp
 
 # ── Server ────────────────────────────────────────────────────
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
@@ -38,9 +65,21 @@ DOWNLOADS_DIR = os.path.join(BASE_DIR, "downloads")
 XLSX_DIR = os.path.join(DOWNLOADS_DIR, "xlsx")
 ZIP_DIR = os.path.join(DOWNLOADS_DIR, "zips")
 PDF_DIR = os.path.join(DOWNLOADS_DIR, "pdfs")
+CACHE_DIR = os.path.join(DOWNLOADS_DIR, "cache")
+PDF_TEXT_CACHE_DIR = os.path.join(CACHE_DIR, "pdf_text")
+STORAGE_STATE_PATH = os.path.join(DOWNLOADS_DIR, "storage_state.json")  # Cookies + localStorage do login
+
+_dirs_ready = False
 
-for d in [DOWNLOADS_DIR, XLSX_DIR, ZIP_DIR, PDF_DIR]:
-    os.makedirs(d, exist_ok=True)
+
+def ensure_dirs():
+    """Cria os diretórios de trabalho (idempotente; chamado no startup e antes de gravar)."""
+    global _dirs_ready
+    if _dirs_ready:
+        return
+    for d in (DOWNLOADS_DIR, XLSX_DIR, ZIP_DIR, PDF_DIR):
+        os.makedirs(d, exist_ok=True)
+    _dirs_ready = True
 
 # ── Catálogo IndFlow (para classificação de aderência) ────────
 CATALOGO_INDFLOW = {
@@ -100,18 +139,16 @@ CATALOGO_INDFLOW = {
 }
 
 # Keywords que indicam alta aderência (match direto com produtos)
-KEYWORDS_ALTA = []
-for categoria in CATALOGO_INDFLOW.values():
-    KEYWORDS_ALTA.extend(categoria)
-KEYWORDS_ALTA.extend([
+KEYWORDS_ALTA = (
+    *(kw for categoria in CATALOGO_INDFLOW.values() for kw in categoria),
     "instrumentação industrial",
     "instrumentacao industrial",
     "instrumento de medição",
     "instrumento de medicao",
-])
+)
 
 # Keywords que indicam média aderência (setor adjacente)
-KEYWORDS_MEDIA = [
+KEYWORDS_MEDIA = (
     "automação industrial",
     "automacao industrial",
     "saneamento",
@@ -131,11 +168,42 @@ KEYWORDS_MEDIA = [
     "processo industrial",
     "abastecimento de água",
     "abastecimento de agua",
-]
+)
 
 # ── Scraping Config ───────────────────────────────────────────
 SCRAPING_DELAY_MIN = 2    # Delay mínimo entre ações (segundos)
 SCRAPING_DELAY_MAX = 5    # Delay máximo entre ações (segundos)
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "4"))  # Scrapers simultâneos sobre o mesmo Chromium
+BROWSER_CDP_URL = os.getenv("BROWSER_CDP_URL", "")  # Chromium externo via CDP (vazio = lança um local)
+BLOCK_ASSETS = os.getenv("BLOCK_ASSETS", "true").lower() == "true"  # Bloqueia imagens/fontes/mídia e rastreadores
+BLOCK_STYLESHEETS = os.getenv("BLOCK_STYLESHEETS", "false").lower() == "true"  # Também bloqueia CSS (pode quebrar is_visible)
+BLOCK_IMAGES = os.getenv("BLOCK_IMAGES", "true").lower() == "true"  # Chromium sem decodificar imagens (--blink-settings)
+VIEWPORT_WIDTH = int(os.getenv("VIEWPORT_WIDTH", "1366"))  # Viewport menor = menos layout, mas pode ativar o layout mobile
+VIEWPORT_HEIGHT = int(os.getenv("VIEWPORT_HEIGHT", "768"))
+HUMANIZE = os.getenv("HUMANIZE", "false").lower() == "true"  # Pausas aleatórias entre ações (desligado em produção)
+STORAGE_STATE_TTL = int(os.getenv("STORAGE_STATE_TTL", str(12 * 3600)))  # Validade da sessão salva (segundos)
+# Deep links candidatos para abrir uma licitação sem paginar o boletim ({boletim_url}, {id}).
+# Separados por "|" na env; lista vazia desliga o recurso.
+LICITACAO_URL_TEMPLATES = tuple(
+    t for t in os.getenv("LICITACAO_URL_TEMPLATES", "{boletim_url}?itemId={id}|{boletim_url}?per_page=500").split("|") if t
+)
+DEFAULT_TIMEOUT_MS = int(os.getenv("DEFAULT_TIMEOUT_MS", "15000"))  # Timeout padrão de ações/esperas do Playwright
+NAV_TIMEOUT_MS = int(os.getenv("NAV_TIMEOUT_MS", "30000"))          # Timeout padrão de navegação (goto)
 DOWNLOAD_TIMEOUT = 60     # Timeout para downloads (segundos)
+XLSX_TTL = int(os.getenv("XLSX_TTL", str(24 * 3600)))  # Validade do XLSX exportado de um boletim (segundos)
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "5"))  # Editais baixados em paralelo (um contexto cada)
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "2"))  # Novas tentativas por edital em falha de navegação
+SAME_PAGE_DOWNLOADS = int(os.getenv("SAME_PAGE_DOWNLOADS", "4"))  # Transferências simultâneas disparadas da mesma página
+DOWNLOAD_SAME_PAGE = os.getenv("DOWNLOAD_SAME_PAGE", "false").lower() == "true"  # Pipeline baixa editais na própria página do boletim (sem contextos extras)
 # ── PDF Logic ───────────────────────────────────────────────
 PDF_MAX_CHARS = 200000    # Limite de caracteres para análise IA (evita estouro de tokens)
+MAX_CONCURRENT_EDITAIS = int(os.getenv("MAX_CONCURRENT_EDITAIS", "5"))  # Editais processados/analisados em paralelo
+PDF_OCR_ENABLED = os.getenv("PDF_OCR_ENABLED", "false").lower() == "true"  # OCR (Tesseract) em páginas escaneadas
+PDF_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS", str(os.cpu_count() or 1)))  # Processos para extrair texto de PDFs
+PDF_TEXT_CACHE_MAX_BYTES = int(os.getenv("PDF_TEXT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))  # Teto do cache de texto de PDFs (LRU)
+
+# ── Cache IA ────────────────────────────────────────────────
+CACHE_TTL = 30 * 24 * 3600            # Validade das respostas cacheadas (segundos)
+CACHE_SEMANTIC_ENABLED = os.getenv("CACHE_SEMANTIC_ENABLED", "true").lower() == "true"
+CACHE_SEMANTIC_THRESHOLD = 0.95       # Similaridade de cosseno mínima para reaproveitar triagem
+CACHE_SEMANTIC_MAX_ITEMS = 5000       # Objetos mantidos no índice semântico em memória
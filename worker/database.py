@@ -3,26 +3,144 @@ Mdulo de integrao com Supabase.
 Salva e consulta licitaes processadas.
 """
 
+import asyncio
 import logging
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 
-from supabase import create_client, Client
+import httpx
+import orjson
 
 from . import config
 
 logger = logging.getLogger(__name__)
 
-_client: Client | None = None
+_client: httpx.AsyncClient | None = None
 
+# Limita as requisições simultâneas ao pool de conexões do Supabase
+_semaphore = asyncio.Semaphore(config.SUPABASE_MAX_CONCURRENCY)
 
-def get_client() -> Client:
-    """Retorna o client Supabase (singleton)."""
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Retorna o client HTTP assíncrono da API REST (PostgREST) do Supabase (singleton).
+    Chamadas não bloqueiam o event loop e reaproveitam o pool de conexões.
+    """
     global _client
     if _client is None:
-        _client = create_client(config.SUPABASE_URL, config.SUPABASE_KEY)
+        _client = httpx.AsyncClient(
+            base_url=f"{config.SUPABASE_URL}/rest/v1",
+            headers={
+                "apikey": config.SUPABASE_KEY,
+                "Authorization": f"Bearer {config.SUPABASE_KEY}",
+            },
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+            timeout=httpx.Timeout(30.0, connect=10.0),
+        )
     return _client
 
 
+async def close_client():
+    """Fecha o pool de conexões com o Supabase (shutdown do app)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# Cache LRU com TTL para check_duplicate: (coluna, valor) → (expira_em, é_duplicata)
+_duplicate_cache: OrderedDict[tuple[str, str], tuple[float, bool]] = OrderedDict()
+
+
+def _duplicate_key(numero_edital: str, numero_conlicitacao: str = "") -> tuple[str, str] | None:
+    """Mesma prioridade do check_duplicate: numero_conlicitacao, senão numero_edital."""
+    if numero_conlicitacao:
+        return ("numero_conlicitacao", numero_conlicitacao)
+    if numero_edital:
+        return ("numero_edital", numero_edital)
+    return None
+
+
+def _cache_duplicate(key: tuple[str, str], is_dup: bool):
+    _duplicate_cache[key] = (time.monotonic() + config.DUPLICATE_CACHE_TTL, is_dup)
+    _duplicate_cache.move_to_end(key)
+    while len(_duplicate_cache) > config.DUPLICATE_CACHE_MAX_ITEMS:
+        _duplicate_cache.popitem(last=False)
+
+
+def _cached_duplicate(key: tuple[str, str]) -> bool | None:
+    entry = _duplicate_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, is_dup = entry
+    if expires_at < time.monotonic():
+        del _duplicate_cache[key]
+        return None
+    _duplicate_cache.move_to_end(key)
+    return is_dup
+
+
+def _remember_saved(records: list[dict]):
+    """Write-through: registros recém-inseridos passam a ser duplicatas conhecidas."""
+    for record in records:
+        if record.get("numero_edital"):
+            _cache_duplicate(("numero_edital", record["numero_edital"]), True)
+        if record.get("numero_conlicitacao"):
+            _cache_duplicate(("numero_conlicitacao", record["numero_conlicitacao"]), True)
+
+
+def _to_record(data: dict) -> dict:
+    """Converte uma licitação do pipeline no registro da tabela licitacoes."""
+    record = {
+        "numero_edital": data.get("edital", ""),
+        "objeto": data.get("objeto", ""),
+        "orgao": data.get("orgao", ""),
+        "cidade_uf": data.get("cidade", "") + ("/" + data.get("uf", "") if data.get("uf") else ""),
+        "data_abertura": data.get("data_abertura"),
+        "valor_estimado": data.get("valor"),
+        "status_licitacao": data.get("status", ""),
+        "palavras_chave": data.get("palavras_chave", ""),
+        "modalidade": data.get("modalidade", ""),
+        "numero_conlicitacao": data.get("numero_conlicitacao", ""),
+        "numero_boletim": data.get("numero_boletim"),
+        "aderencia": data.get("aderencia", "BAIXA"),
+        "recomendacao": data.get("recomendacao", ""),
+        "resumo_ia": data.get("resumo_ia", ""),
+        "analise_completa": data.get("analise_completa"),
+        "arquivo_edital_url": data.get("arquivo_edital_url"),
+        "processado_em": datetime.now(timezone.utc).isoformat(),
+    }
+
+    # Remove campos None
+    return {k: v for k, v in record.items() if v is not None and v != ""}
+
+
+async def _upsert(records: list[dict]) -> list[dict]:
+    """
+    Insere os registros num único INSERT ... ON CONFLICT DO NOTHING.
+    Duplicatas de numero_conlicitacao são ignoradas pelo banco.
+
+    Returns: Registros efetivamente inseridos
+    """
+    # Registros podem ter chaves diferentes (campos vazios são removidos):
+    # columns lista a união e missing=default aplica o DEFAULT da coluna às ausentes
+    columns = ",".join(dict.fromkeys(k for record in records for k in record))
+    response = await get_client().post(
+        "/licitacoes",
+        params={"on_conflict": "numero_conlicitacao", "columns": columns},
+        content=orjson.dumps(records),
+        headers={
+            "Content-Type": "application/json",
+            "Prefer": "return=representation,resolution=ignore-duplicates,missing=default",
+        },
+    )
+    response.raise_for_status()
+    rows = response.json()
+    _remember_saved(rows)
+    return rows
+
+
 async def save_licitacao(data: dict) -> dict | None:
     """
     Salva uma licitao processada no Supabase.
@@ -32,33 +150,10 @@ async def save_licitacao(data: dict) -> dict | None:
     Returns: Registro salvo ou None
     """
     try:
-        client = get_client()
-        record = {
-            "numero_edital": data.get("edital", ""),
-            "objeto": data.get("objeto", ""),
-            "orgao": data.get("orgao", ""),
-            "cidade_uf": data.get("cidade", "") + ("/" + data.get("uf", "") if data.get("uf") else ""),
-            "data_abertura": data.get("data_abertura"),
-            "valor_estimado": data.get("valor"),
-            "status_licitacao": data.get("status", ""),
-            "palavras_chave": data.get("palavras_chave", ""),
-            "modalidade": data.get("modalidade", ""),
-            "numero_conlicitacao": data.get("numero_conlicitacao", ""),
-            "numero_boletim": data.get("numero_boletim"),
-            "aderencia": data.get("aderencia", "BAIXA"),
-            "recomendacao": data.get("recomendacao", ""),
-            "resumo_ia": data.get("resumo_ia", ""),
-            "analise_completa": data.get("analise_completa"),
-            "arquivo_edital_url": data.get("arquivo_edital_url"),
-            "processado_em": datetime.now(timezone.utc).isoformat(),
-        }
-
-        # Remove campos None
-        record = {k: v for k, v in record.items() if v is not None and v != ""}
-
-        result = client.table("licitacoes").insert(record).execute()
-        logger.info(f"[OK] Licitao salva: {data.get('edital', '?')}")
-        return result.data[0] if result.data else None
+        rows = await _upsert([_to_record(data)])
+        if rows:
+            logger.info(f"[OK] Licitação salva: {data.get('edital', '?')}")
+        return rows[0] if rows else None
 
     except Exception as e:
         logger.error(f" Erro ao salvar licitao: {e}")
@@ -68,14 +163,25 @@ async def save_licitacao(data: dict) -> dict | None:
 async def save_batch(licitacoes: list[dict]) -> int:
     """
     Salva licitaes em lote.
+    Uma única requisição para o lote inteiro; se o banco rejeitar o lote
+    (ex.: um registro inválido), salva registro a registro.
     
     Returns: Nmero de registros salvos com sucesso
     """
-    saved = 0
-    for lic in licitacoes:
-        result = await save_licitacao(lic)
-        if result:
-            saved += 1
+    if not licitacoes:
+        return 0
+
+    try:
+        saved = len(await _upsert([_to_record(lic) for lic in licitacoes]))
+    except Exception as e:
+        logger.error(f"Erro no insert em lote, salvando individualmente: {e}")
+
+        async def save_one(lic: dict) -> dict | None:
+            async with _semaphore:
+                return await save_licitacao(lic)
+
+        results = await asyncio.gather(*(save_one(lic) for lic in licitacoes), return_exceptions=True)
+        saved = sum(1 for r in results if r and not isinstance(r, Exception))
     logger.info(f" Lote salvo: {saved}/{len(licitacoes)} registros")
     return saved
 
@@ -83,44 +189,87 @@ async def save_batch(licitacoes: list[dict]) -> int:
 async def check_duplicate(numero_edital: str, numero_conlicitacao: str = "") -> bool:
     """
     Verifica se uma licitao j foi processada.
+    Respostas ficam em cache LRU por DUPLICATE_CACHE_TTL segundos.
     """
-    try:
-        client = get_client()
-        query = client.table("licitacoes").select("id")
+    key = _duplicate_key(numero_edital, numero_conlicitacao)
+    if key is None:
+        return False
 
-        if numero_conlicitacao:
-            query = query.eq("numero_conlicitacao", numero_conlicitacao)
-        elif numero_edital:
-            query = query.eq("numero_edital", numero_edital)
-        else:
-            return False
+    cached = _cached_duplicate(key)
+    if cached is not None:
+        return cached
 
-        result = query.limit(1).execute()
-        return len(result.data) > 0
+    try:
+        column, value = key
+        response = await get_client().get(
+            "/licitacoes",
+            params={"select": "id", column: f"eq.{value}", "limit": 1},
+        )
+        response.raise_for_status()
+        is_dup = len(response.json()) > 0
+        _cache_duplicate(key, is_dup)
+        return is_dup
 
     except Exception as e:
         logger.error(f"Erro ao verificar duplicata: {e}")
         return False
 
 
+def _postgrest_list(values) -> str:
+    """Lista para o operador in.(...) do PostgREST, com cada valor entre aspas."""
+    quoted = ('"' + v.replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values)
+    return f"({','.join(quoted)})"
+
+
+async def check_duplicates_batch(pairs: list[tuple[str, str]]) -> set[tuple[str, str]]:
+    """
+    Versão em lote do check_duplicate: uma consulta por coluna (in.(...))
+    em vez de uma por licitação. Mesma regra de prioridade e mesmo cache.
+
+    Args:
+        pairs: Lista de (numero_edital, numero_conlicitacao)
+    Returns: Conjunto dos pares que já estão no banco
+    """
+    keys = {pair: _duplicate_key(*pair) for pair in pairs}
+
+    # Chaves ainda não conhecidas pelo cache, agrupadas por coluna
+    pending: dict[str, set[str]] = {}
+    for key in set(keys.values()):
+        if key is not None and _cached_duplicate(key) is None:
+            pending.setdefault(key[0], set()).add(key[1])
+
+    try:
+        for column, values in pending.items():
+            values = sorted(values)
+            # Lotes limitados para a URL não passar do limite do servidor
+            for start in range(0, len(values), config.DUPLICATE_BATCH_SIZE):
+                chunk = values[start:start + config.DUPLICATE_BATCH_SIZE]
+                response = await get_client().get(
+                    "/licitacoes",
+                    params={"select": column, column: f"in.{_postgrest_list(chunk)}"},
+                )
+                response.raise_for_status()
+                found = {row[column] for row in response.json()}
+                for value in chunk:
+                    _cache_duplicate((column, value), value in found)
+
+    except Exception as e:
+        logger.error(f"Erro ao verificar duplicatas em lote: {e}")
+
+    return {pair for pair, key in keys.items() if key is not None and _cached_duplicate(key)}
+
+
 async def get_stats(days: int = 30) -> dict:
     """
     Retorna estatsticas das licitaes processadas.
+    Considera apenas as processadas nos últimos `days` dias.
     """
     try:
-        client = get_client()
-        result = client.table("licitacoes").select("aderencia, recomendacao").execute()
-        
-        stats = {
-            "total": len(result.data),
-            "alta": sum(1 for r in result.data if r.get("aderencia") == "ALTA"),
-            "media": sum(1 for r in result.data if r.get("aderencia") == "MEDIA"),
-            "baixa": sum(1 for r in result.data if r.get("aderencia") == "BAIXA"),
-            "participar": sum(1 for r in result.data if r.get("recomendacao") == "PARTICIPAR"),
-            "acompanhar": sum(1 for r in result.data if r.get("recomendacao") == "ACOMPANHAR"),
-            "descartar": sum(1 for r in result.data if r.get("recomendacao") == "DESCARTAR"),
-        }
-        return stats
+        # Agregação no Postgres (função licitacoes_stats em schema.sql): só 7 inteiros trafegam
+        response = await get_client().post("/rpc/licitacoes_stats", json={"p_days": days})
+        response.raise_for_status()
+        rows = response.json()
+        return rows[0] if rows else {}
 
     except Exception as e:
         logger.error(f"Erro ao obter estatsticas: {e}")
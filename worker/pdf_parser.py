@@ -3,18 +3,292 @@ Módulo de processamento de PDFs e arquivos ZIP.
 Descompacta ZIPs, extrai texto de PDFs (incluindo OCR para escaneados).
 """
 
+import hashlib
 import logging
+import multiprocessing
 import os
+import posixpath
+import re
+import threading
 import zipfile
-from pathlib import Path
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from xml.etree import ElementTree as ET
 
+import diskcache
 import fitz  # PyMuPDF
-import openpyxl
 
 from . import config
 
 logger = logging.getLogger(__name__)
 
+# Descompressão DEFLATE via ISA-L (SIMD) quando disponível; senão, zlib da stdlib
+try:
+    from isal import isal_zlib
+
+    zipfile.zlib = isal_zlib
+    logger.info("[ZIP] Backend de descompressão: isal_zlib")
+except ImportError:
+    logger.info("[ZIP] Backend de descompressão: zlib (stdlib)")
+
+# Avisos do MuPDF (PDFs malformados são comuns em editais) só geram ruído no log
+fitz.TOOLS.mupdf_display_errors(False)
+
+# Texto puro na ordem do PDF; ligaduras expandidas (ﬁ → fi) para não atrapalhar a LLM
+_TEXT_FLAGS = fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_LIGATURES
+
+_PDF_SUFFIXES = frozenset({".pdf"})
+_ZIP_SUFFIXES = frozenset({".zip"})
+
+
+def _suffix(path: str) -> str:
+    return os.path.splitext(path)[1].lower()
+
+
+def is_pdf(path: str) -> bool:
+    """Extensão .pdf (sem diferenciar maiúsculas)."""
+    return _suffix(path) in _PDF_SUFFIXES
+
+
+def is_zip(path: str) -> bool:
+    """Extensão .zip (sem diferenciar maiúsculas)."""
+    return _suffix(path) in _ZIP_SUFFIXES
+
+
+_pool: ProcessPoolExecutor | None = None
+# Os editais são processados em threads paralelas (asyncio.to_thread): sem lock, duas
+# podiam criar cada uma o seu pool e um deles vazaria sem shutdown
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """
+    Pool de processos para extração de texto (singleton, criado no primeiro edital).
+    Usa spawn: o processo principal tem threads (Playwright, asyncio) e fork seria inseguro.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=config.PDF_MAX_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+_zip_pool: ThreadPoolExecutor | None = None
+
+
+def _get_zip_pool() -> ThreadPoolExecutor:
+    """Pool de threads para ZIPs aninhados (inflate libera o GIL). Singleton."""
+    global _zip_pool
+    if _zip_pool is None:
+        with _pool_lock:
+            if _zip_pool is None:
+                _zip_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="zip")
+    return _zip_pool
+
+
+def shutdown_pool():
+    """Encerra os pools de processos e threads (shutdown do app)."""
+    global _pool, _zip_pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+        if _zip_pool is not None:
+            _zip_pool.shutdown(cancel_futures=True)
+            _zip_pool = None
+
+
+# Arquivos extraídos por diretório de extração (evita um novo os.walk no envio dos PDFs)
+_EXTRACTION_INDEX: OrderedDict[str, list[str]] = OrderedDict()
+_EXTRACTION_INDEX_MAX = 1000
+_extraction_index_lock = threading.Lock()
+
+
+def get_extracted_files(extract_dir: str) -> list[str] | None:
+    """Arquivos extraídos do ZIP cujo diretório de extração é extract_dir (None se não indexado)."""
+    return _EXTRACTION_INDEX.get(os.path.abspath(extract_dir))
+
+
+def _truncate_text(text: str, max_chars: int) -> str:
+    """Limita o tamanho para não estourar token limit da LLM."""
+    if len(text) <= max_chars:
+        return text
+    logger.info(f"⚠️ Texto truncado: {len(text)} chars (limite: {max_chars})")
+    return text[:max_chars] + "\n\n[... TEXTO TRUNCADO ...]"
+
+
+# ── Leitura de XLSX em streaming (SAX) ──
+# O XLSX é um ZIP de XMLs: a planilha é lida com iterparse, linha a linha,
+# sem montar o DOM inteiro nem carregar o openpyxl.
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_DOC_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# numFmtId embutidos do Excel que representam datas/horas
+_BUILTIN_DATE_FORMATS = frozenset((*range(14, 23), *range(45, 48)))
+# Trechos de formato que não indicam data: "texto literal", [cor/condição], \escape
+_FORMAT_LITERALS_RE = re.compile(r'"[^"]*"|\[[^\]]*\]|\\.')
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+
+
+def _first_sheet_path(zf: zipfile.ZipFile) -> str:
+    """Caminho da planilha ativa (workbook.xml + rels), como o wb.active do openpyxl."""
+    try:
+        workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+        view = workbook.find(f"{_NS}bookViews/{_NS}workbookView")
+        active = int(view.get("activeTab", 0)) if view is not None else 0
+        sheets = workbook.findall(f"{_NS}sheets/{_NS}sheet")
+        rel_id = sheets[min(active, len(sheets) - 1)].get(f"{_NS_DOC_REL}id")
+
+        rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+        for rel in rels.iter(f"{_NS_PKG_REL}Relationship"):
+            if rel.get("Id") == rel_id:
+                target = rel.get("Target")
+                if target.startswith("/"):
+                    return target.lstrip("/")
+                return posixpath.normpath(posixpath.join("xl", target))
+    except (KeyError, IndexError, ValueError, ET.ParseError):
+        pass
+    return "xl/worksheets/sheet1.xml"
+
+
+def _rich_text(elem: ET.Element) -> str:
+    """Texto de um <si>/<is>: <t> simples ou runs <r><t> (ignora a fonética <rPh>)."""
+    t = elem.find(f"{_NS}t")
+    if t is not None:
+        return t.text or ""
+    return "".join(r.findtext(f"{_NS}t") or "" for r in elem.iterfind(f"{_NS}r"))
+
+
+def _read_shared_strings(zf: zipfile.ZipFile) -> list[str]:
+    """Carrega a tabela de shared strings uma única vez (também em streaming)."""
+    try:
+        source = zf.open("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    strings = []
+    with source:
+        for _, elem in ET.iterparse(source, events=("end",)):
+            if elem.tag == f"{_NS}si":
+                strings.append(_rich_text(elem))
+                elem.clear()
+    return strings
+
+
+def _is_date_format(code: str) -> bool:
+    code = _FORMAT_LITERALS_RE.sub("", code).lower()
+    return any(c in code for c in "dmyhs")
+
+
+def _read_date_styles(zf: zipfile.ZipFile) -> frozenset[int]:
+    """Índices de estilo (atributo s da célula) cujo formato numérico é data."""
+    try:
+        styles = ET.fromstring(zf.read("xl/styles.xml"))
+    except KeyError:
+        return frozenset()
+
+    custom_dates = {
+        int(fmt.get("numFmtId"))
+        for fmt in styles.iterfind(f"{_NS}numFmts/{_NS}numFmt")
+        if _is_date_format(fmt.get("formatCode", ""))
+    }
+    return frozenset(
+        i for i, xf in enumerate(styles.iterfind(f"{_NS}cellXfs/{_NS}xf"))
+        if (num_fmt := int(xf.get("numFmtId", 0))) in _BUILTIN_DATE_FORMATS or num_fmt in custom_dates
+    )
+
+
+def _column_index(ref: str) -> int:
+    """'C12' → 2 (índice zero-based da coluna)."""
+    index = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + (ord(ch.upper()) - 64)
+    return index - 1
+
+
+def _cell_value(cell: ET.Element, shared_strings: list[str], date_styles: frozenset[int]):
+    """Converte um <c> no valor Python equivalente ao que o openpyxl devolveria."""
+    cell_type = cell.get("t", "n")
+    if cell_type == "inlineStr":
+        inline = cell.find(f"{_NS}is")
+        return _rich_text(inline) if inline is not None else None
+
+    raw = cell.findtext(f"{_NS}v")
+    if raw is None:
+        return None
+    if cell_type == "s":
+        return shared_strings[int(raw)]
+    if cell_type == "b":
+        return raw == "1"
+    if cell_type in ("str", "e"):
+        return raw
+    if cell_type == "d":
+        # Data ISO 8601 gravada como texto; só hora (sem data) vira time, como no openpyxl
+        return datetime.fromisoformat(raw) if "-" in raw else time.fromisoformat(raw)
+
+    number = float(raw) if "." in raw or "E" in raw or "e" in raw else int(raw)
+    if int(cell.get("s", 0)) in date_styles:
+        return _EXCEL_EPOCH + timedelta(days=number)
+    return number
+
+
+def _iter_xlsx_rows(filepath: str):
+    """
+    Gera (número_da_linha, tupla_de_valores) da planilha ativa do XLSX.
+    Cada <row> é descartado após a leitura, mantendo a memória constante.
+    """
+    with zipfile.ZipFile(filepath) as zf:
+        shared_strings = _read_shared_strings(zf)
+        date_styles = _read_date_styles(zf)
+
+        with zf.open(_first_sheet_path(zf)) as sheet:
+            row_number = 0
+            for _, elem in ET.iterparse(sheet, events=("end",)):
+                if elem.tag != f"{_NS}row":
+                    continue
+                row_number = int(elem.get("r", row_number + 1))
+
+                values = []
+                for cell in elem.iterfind(f"{_NS}c"):
+                    ref = cell.get("r")
+                    if ref:
+                        # Células vazias não aparecem no XML: preencher as lacunas
+                        values.extend([None] * (_column_index(ref) - len(values)))
+                    values.append(_cell_value(cell, shared_strings, date_styles))
+
+                elem.clear()
+                yield row_number, tuple(values)
+
+
+# Colunas esperadas no XLSX (flexível para variações de nome)
+_EXPECTED_FIELDS = {
+    "objeto": ("objeto", "descrição", "descricao", "description"),
+    "orgao": ("órgão", "orgao", "orgão licitante", "orgao licitante"),
+    "cidade": ("cidade", "município", "municipio", "city"),
+    "uf": ("uf", "estado", "state"),
+    "data_abertura": ("data abertura", "abertura", "data", "datas"),
+    "edital": ("edital", "nº edital", "numero edital", "nº"),
+    "status": ("status", "situação", "situacao"),
+    "palavras_chave": ("palavras-chave", "palavras chave", "keywords", "palavra-chave"),
+    "valor": ("valor", "valor estimado", "preço", "preco"),
+    "modalidade": ("modalidade", "tipo"),
+    "numero_conlicitacao": ("nº conlicitação", "conlicitação", "conlicitacao", "id"),
+}
+
+# Uma alternação compilada por campo: "alguma variação está no cabeçalho" numa única busca
+_FIELD_PATTERNS = tuple(
+    (field, re.compile("|".join(map(re.escape, variations))))
+    for field, variations in _EXPECTED_FIELDS.items()
+)
+
 
 def parse_xlsx(filepath: str) -> list[dict]:
     """
@@ -25,44 +299,27 @@ def parse_xlsx(filepath: str) -> list[dict]:
     Returns: Lista de dicts com os dados de cada licitação
     """
     try:
-        wb = openpyxl.load_workbook(filepath, read_only=True)
-        ws = wb.active
-
-        # Ler cabeçalhos da primeira linha
-        headers = []
-        for cell in ws[1]:
-            headers.append(str(cell.value or "").strip().lower())
-
-        # Mapear colunas esperadas (flexível para variações de nome)
-        column_map = {}
-        expected_fields = {
-            "objeto": ["objeto", "descrição", "descricao", "description"],
-            "orgao": ["órgão", "orgao", "orgão licitante", "orgao licitante"],
-            "cidade": ["cidade", "município", "municipio", "city"],
-            "uf": ["uf", "estado", "state"],
-            "data_abertura": ["data abertura", "abertura", "data", "datas"],
-            "edital": ["edital", "nº edital", "numero edital", "nº"],
-            "status": ["status", "situação", "situacao"],
-            "palavras_chave": ["palavras-chave", "palavras chave", "keywords", "palavra-chave"],
-            "valor": ["valor", "valor estimado", "preço", "preco"],
-            "modalidade": ["modalidade", "tipo"],
-            "numero_conlicitacao": ["nº conlicitação", "conlicitação", "conlicitacao", "id"],
-        }
-
-        for field, variations in expected_fields.items():
+        # Uma única passada em streaming: a primeira linha é o cabeçalho
+        rows_iter = _iter_xlsx_rows(filepath)
+        _, header_row = next(rows_iter, (1, ()))
+        headers = [str(value or "").strip().lower() for value in header_row]
+
+        # Mapear colunas esperadas: para cada campo, o primeiro cabeçalho que contém uma variação
+        columns = []
+        for field, pattern in _FIELD_PATTERNS:
             for i, header in enumerate(headers):
-                if any(v in header for v in variations):
-                    column_map[field] = i
+                if pattern.search(header):
+                    columns.append((field, i))
                     break
 
         # Ler dados
         licitacoes = []
-        for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+        for row_idx, row in rows_iter:
             if not row or all(cell is None for cell in row):
                 continue
 
             licitacao = {"row_index": row_idx}
-            for field, col_idx in column_map.items():
+            for field, col_idx in columns:
                 if col_idx < len(row):
                     value = row[col_idx]
                     licitacao[field] = str(value).strip() if value else ""
@@ -73,7 +330,6 @@ def parse_xlsx(filepath: str) -> list[dict]:
 
             licitacoes.append(licitacao)
 
-        wb.close()
         logger.info(f"[OK] XLSX parseado: {len(licitacoes)} licitações encontradas")
         return licitacoes
 
@@ -85,7 +341,8 @@ def parse_xlsx(filepath: str) -> list[dict]:
 def extract_zip(zip_path: str, processed_zips: set = None) -> list[str]:
     """
     Descompacta um arquivo ZIP e retorna os caminhos dos arquivos extraídos.
-    Suporta extração recursiva de ZIPs aninhados.
+    Suporta ZIPs aninhados: uma fila de trabalho processa um nível por vez,
+    com os ZIPs de cada nível descompactados em paralelo no pool de threads.
     
     Args:
         zip_path: Caminho do arquivo ZIP
@@ -94,86 +351,199 @@ def extract_zip(zip_path: str, processed_zips: set = None) -> list[str]:
     """
     if processed_zips is None:
         processed_zips = set()
-    
-    abs_path = os.path.abspath(zip_path)
-    if abs_path in processed_zips:
-        return []
-    processed_zips.add(abs_path)
 
+    # Conteúdo direto de cada ZIP (None = não é ZIP), na ordem em que foram descobertos
+    direct: dict[str, list[str] | None] = {}
+    pending = deque([zip_path])
+    while pending:
+        level = []
+        while pending:
+            zp = pending.popleft()
+            abs_path = os.path.abspath(zp)
+            if abs_path not in processed_zips:
+                processed_zips.add(abs_path)
+                level.append(zp)
+
+        if len(level) > 1:
+            entries_per_zip = list(_get_zip_pool().map(_extract_zip_entries, level))
+        else:
+            entries_per_zip = [_extract_zip_entries(zp) for zp in level]
+
+        for zp, entries in zip(level, entries_per_zip):
+            direct[zp] = entries
+            pending.extend(e for e in entries or () if is_zip(e))
+
+    # Montar as listas de baixo para cima: os filhos aparecem depois dos pais em direct,
+    # então percorrer ao contrário garante que cada ZIP aninhado já foi expandido
+    expanded: dict[str, list[str]] = {}
+    for zp in reversed(direct):
+        entries = direct[zp]
+        if entries is None:
+            # Pode ser um PDF direto (não ZIP)
+            expanded[zp] = [zp]
+            continue
+
+        # Mantém a ordem do os.walk, com o conteúdo dos ZIPs aninhados no lugar deles
+        all_extracted = []
+        for filepath in entries:
+            if is_zip(filepath):
+                all_extracted.extend(expanded.get(filepath, ()))
+            else:
+                all_extracted.append(filepath)
+        expanded[zp] = all_extracted
+
+        extract_dir = os.path.abspath(os.path.splitext(zp)[0])
+        with _extraction_index_lock:
+            _EXTRACTION_INDEX[extract_dir] = all_extracted
+            _EXTRACTION_INDEX.move_to_end(extract_dir)
+            if len(_EXTRACTION_INDEX) > _EXTRACTION_INDEX_MAX:
+                _EXTRACTION_INDEX.popitem(last=False)
+
+    all_extracted = expanded.get(zip_path, [])
+    logger.info(f"✅ ZIP descompactado (recursivo): {len(all_extracted)} arquivos totais de {zip_path}")
+    return all_extracted
+
+
+def _extract_zip_entries(zip_path: str) -> list[str] | None:
+    """
+    Descompacta um único ZIP (sem recursão) ao lado dele, numa pasta com o mesmo nome.
+    Returns: Arquivos extraídos ([] em caso de erro) ou None se o arquivo não for ZIP
+    """
     try:
         extract_dir = os.path.splitext(zip_path)[0]
         os.makedirs(extract_dir, exist_ok=True)
 
+        # Só PDFs (o que a análise usa) e ZIPs (recursão); o resto nem é descomprimido
+        base_dir = os.path.realpath(extract_dir)
         with zipfile.ZipFile(zip_path, "r") as zf:
-            zf.extractall(extract_dir)
-
-        all_extracted = []
-        # Percorrer os arquivos extraídos para ver se há mais ZIPs
+            for info in zf.infolist():
+                if info.is_dir() or not (is_pdf(info.filename) or is_zip(info.filename)):
+                    continue
+                # Zip-Slip: a entrada não pode escapar do diretório de extração
+                target = os.path.realpath(os.path.join(base_dir, info.filename))
+                if os.path.commonpath([base_dir, target]) != base_dir:
+                    logger.warning(f"⚠️ Entrada ignorada (fora do diretório de extração): {info.filename}")
+                    continue
+                zf.extract(info, extract_dir)
+
+        entries = []
         for root, dirs, files in os.walk(extract_dir):
             for f in files:
-                filepath = os.path.join(root, f)
-                
-                # Se for outro ZIP, extrair recursivamente
-                if f.lower().endswith(".zip"):
-                    nested_files = extract_zip(filepath, processed_zips)
-                    all_extracted.extend(nested_files)
-                else:
-                    all_extracted.append(filepath)
-
-        logger.info(f"✅ ZIP descompactado (recursivo): {len(all_extracted)} arquivos totais de {zip_path}")
-        return all_extracted
+                entries.append(os.path.join(root, f))
+        return entries
 
     except zipfile.BadZipFile:
-        # Pode ser um PDF direto (não ZIP)
         logger.warning(f"⚠️ Arquivo não é ZIP, pode ser PDF direto: {zip_path}")
-        return [zip_path]
+        return None
     except Exception as e:
         logger.error(f"❌ Erro ao descompactar ZIP: {e}")
         return []
 
 
-def extract_text_from_pdf(pdf_path: str) -> str:
+_text_cache: diskcache.Cache | None = None
+
+
+def _get_text_cache() -> diskcache.Cache:
+    """
+    Cache em disco do texto extraído (singleton por processo; o diskcache é seguro entre
+    os processos do pool). Limitado a PDF_TEXT_CACHE_MAX_BYTES, descartando os menos usados.
+    """
+    global _text_cache
+    if _text_cache is None:
+        with _pool_lock:
+            if _text_cache is None:
+                _text_cache = diskcache.Cache(
+                    config.PDF_TEXT_CACHE_DIR,
+                    size_limit=config.PDF_TEXT_CACHE_MAX_BYTES,
+                    eviction_policy="least-recently-used",
+                )
+    return _text_cache
+
+
+def _pdf_cache_key(pdf_path: str, max_chars: int) -> str:
+    """Chave do cache do texto: hash do primeiro 1 MiB + tamanho do PDF + limite."""
+    h = hashlib.sha1()
+    with open(pdf_path, "rb") as f:
+        h.update(f.read(1 << 20))
+    h.update(f"{os.path.getsize(pdf_path)}:{max_chars}:{_TEXT_FLAGS}:{config.PDF_OCR_ENABLED}".encode())
+    return h.hexdigest()
+
+
+def extract_text_from_pdf(pdf_path: str, max_chars: int = config.PDF_MAX_CHARS) -> str:
     """
     Extrai texto de um PDF usando PyMuPDF.
     Suporta PDFs nativos (texto) e tenta OCR para escaneados.
+    O texto fica em cache em disco: reprocessar o mesmo edital não reabre o PDF.
     
     Args:
         pdf_path: Caminho do arquivo PDF
+        max_chars: Limite de caracteres extraídos
     Returns: Texto extraído do PDF
     """
     try:
-        doc = fitz.open(pdf_path)
+        cache_key = _pdf_cache_key(pdf_path, max_chars)
+    except OSError:
+        cache_key = None  # PDF ilegível: a extração registra o erro
+
+    if cache_key:
+        text = _get_text_cache().get(cache_key)
+        if text is not None:
+            logger.info(f"✅ PDF em cache: {len(text)} caracteres de {pdf_path}")
+            return text
+
+    text = _extract_text(pdf_path, max_chars)
+
+    if text and cache_key:
+        try:
+            _get_text_cache().set(cache_key, text)
+        except Exception as e:
+            logger.warning(f"⚠️ Não foi possível gravar o cache do PDF {pdf_path}: {e}")
+    return text
+
+
+def _ocr_page(page: fitz.Page) -> str:
+    """OCR da página via Tesseract (PDF_OCR_ENABLED). Retorna "" se o Tesseract não estiver disponível."""
+    try:
+        textpage = page.get_textpage_ocr(language="por", full=True)
+        return page.get_text("text", sort=False, flags=_TEXT_FLAGS, textpage=textpage)
+    except Exception as e:
+        logger.warning(f"⚠️ OCR indisponível: {e}")
+        return ""
+
+
+def _extract_text(pdf_path: str, max_chars: int) -> str:
+    """
+    Extração propriamente dita (sem cache).
+    Para de ler páginas assim que max_chars caracteres foram acumulados.
+    """
+    try:
+        # filetype explícito: pula a detecção de formato (e aceita arquivos sem extensão)
+        doc = fitz.open(pdf_path, filetype="pdf")
         full_text = []
+        total = 0
 
         for page_num, page in enumerate(doc, start=1):
-            text = page.get_text("text")
+            text = page.get_text("text", sort=False, flags=_TEXT_FLAGS)
+            if not text.strip() and config.PDF_OCR_ENABLED:
+                text = _ocr_page(page)
             if text.strip():
                 full_text.append(text)
+                total += len(text)
+                if total >= max_chars:
+                    logger.info(f"⚠️ Limite de {max_chars} chars atingido na página {page_num} de {pdf_path}")
+                    break
             else:
                 # Página sem texto — provavelmente escaneada
-                # Tentar extração via OCR do PyMuPDF (se disponível)
-                try:
-                    text = page.get_text("text", flags=fitz.TEXT_PRESERVE_WHITESPACE)
-                    if text.strip():
-                        full_text.append(text)
-                    else:
-                        logger.warning(
-                            f"⚠️ Página {page_num} de {pdf_path} sem texto "
-                            f"(possível imagem escaneada — OCR não disponível)"
-                        )
-                except Exception:
-                    pass
+                logger.warning(
+                    f"⚠️ Página {page_num} de {pdf_path} sem texto "
+                    f"(possível imagem escaneada — "
+                    f"{'OCR sem resultado' if config.PDF_OCR_ENABLED else 'OCR desativado'})"
+                )
 
         doc.close()
 
-        result = "\n\n".join(full_text)
-        
-        # Limitar tamanho para não estourar token limit da LLM
-        max_chars = config.PDF_MAX_CHARS
-        if len(result) > max_chars:
-            result = result[:max_chars] + "\n\n[... TEXTO TRUNCADO ...]"
-            logger.info(f"⚠️ PDF truncado: {len(result)} chars (limite: {max_chars})")
-
+        # O limite final (com aviso de truncamento) é aplicado por quem chama, no texto combinado
+        result = "\n\n".join(full_text)[:max_chars]
         logger.info(f"✅ PDF parseado: {len(result)} caracteres de {pdf_path}")
         return result
 
@@ -203,11 +573,9 @@ def process_edital_download(download_path: str) -> dict:
 
     try:
         # Verificar se é ZIP ou PDF
-        ext = Path(download_path).suffix.lower()
-        
-        if ext == ".zip":
+        if is_zip(download_path):
             files = extract_zip(download_path)
-        elif ext == ".pdf":
+        elif is_pdf(download_path):
             files = [download_path]
         else:
             # Tentar como ZIP primeiro, depois como PDF
@@ -216,23 +584,27 @@ def process_edital_download(download_path: str) -> dict:
                 files = [download_path]
 
         # Filtrar apenas PDFs
-        pdf_files = [f for f in files if f.lower().endswith(".pdf")]
+        pdf_files = [f for f in files if is_pdf(f)]
         result["pdf_files"] = pdf_files
 
         if not pdf_files:
             logger.warning(f"⚠️ Nenhum PDF encontrado em {download_path}")
             # Tentar ler o arquivo original como PDF mesmo sem extensão
-            text = extract_text_from_pdf(download_path)
+            text = _truncate_text(extract_text_from_pdf(download_path), config.PDF_MAX_CHARS)
             if text:
                 result["texts"] = [text]
                 result["combined_text"] = text
                 result["success"] = True
             return result
 
-        # Extrair texto de cada PDF
+        # Extrair texto de cada PDF (em paralelo entre processos quando há mais de um)
+        if len(pdf_files) > 1:
+            extracted = list(_get_pool().map(extract_text_from_pdf, pdf_files))
+        else:
+            extracted = [extract_text_from_pdf(pdf_files[0])]
+
         texts = []
-        for pdf_path in pdf_files:
-            text = extract_text_from_pdf(pdf_path)
+        for pdf_path, text in zip(pdf_files, extracted):
             if text:
                 texts.append({
                     "filename": os.path.basename(pdf_path),
@@ -240,9 +612,11 @@ def process_edital_download(download_path: str) -> dict:
                 })
 
         result["texts"] = texts
-        result["combined_text"] = "\n\n---\n\n".join(
-            f"📄 {t['filename']}:\n{t['text']}" for t in texts
-        )
+        # Partes numa lista e um único join (sem um f-string intermediário por PDF)
+        parts = []
+        for t in texts:
+            parts += ("📄 ", t["filename"], ":\n", t["text"], "\n\n---\n\n")
+        result["combined_text"] = _truncate_text("".join(parts[:-1]), config.PDF_MAX_CHARS)
         result["success"] = len(texts) > 0
 
         logger.info(
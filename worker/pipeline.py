@@ -4,29 +4,101 @@ Coordena: Scraping  Parse  Triagem  Download  Anlise  Banco  WhatsApp
 """
 
 import asyncio
+import functools
 import logging
 import os
 import re
+import stat
 from datetime import datetime
 
 from . import config
 from .scraper import ConLicitacaoScraper, run_scraping_flow
-from .pdf_parser import parse_xlsx, process_edital_download
-from .analyzer import triage_licitacao, analyze_edital, batch_triage
-from .database import save_batch, check_duplicate
-from .whatsapp import send_report, send_whatsapp_document
+from .pdf_parser import parse_xlsx, process_edital_download, get_extracted_files, is_pdf
+from .analyzer import triage_licitacao, analyze_edital, batch_triage, batch_triage_via_batch_api
+from .database import save_batch, check_duplicates_batch
+from .whatsapp import send_report_async, send_whatsapp_document
 
 logger = logging.getLogger(__name__)
 
+_BOLETIM_RE = re.compile(r'\[(\d+)\]')
 
+# Limita editais processados ao mesmo tempo (CPU do parse + cota da OpenAI)
+_edital_semaphore = asyncio.Semaphore(config.MAX_CONCURRENT_EDITAIS)
+
+
+@functools.lru_cache(maxsize=1024)
 def extract_boletim_number_from_subject(subject: str) -> int | None:
-    """Extrai o nmero do boletim do assunto do e-mail."""
-    match = re.search(r'\[(\d+)\]', subject)
+    """Extrai o nmero do boletim do assunto do e-mail (memoizado: reenvios do webhook repetem o assunto)."""
+    match = _BOLETIM_RE.search(subject)
     if match:
         return int(match.group(1))
     return None
 
 
+def _scan_pdfs(root: str):
+    """Gera (caminho, tamanho) dos PDFs sob root; o tamanho vem do próprio os.scandir."""
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scan_pdfs(entry.path)
+            elif is_pdf(entry.name) and entry.is_file():
+                yield entry.path, entry.stat().st_size
+
+
+def _stat_sizes(paths) -> dict[str, int]:
+    """Tamanho de cada arquivo regular existente (um único stat por caminho)."""
+    sizes = {}
+    for p in paths:
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            sizes[p] = st.st_size
+    return sizes
+
+
+async def _process_one_alta(lic: dict, download: dict | None) -> bool:
+    """
+    Processa o edital baixado de uma licitação de Alta aderência:
+    extrai o texto e roda a análise profunda, atualizando lic.
+
+    Returns: True se o edital foi analisado
+    """
+    num_con = lic.get("numero_conlicitacao")
+    if not (download and download["success"] and download["filepath"]):
+        # Edital não disponível para download — anotar e continuar
+        lic["edital_disponivel"] = False
+        logger.info(f"[INFO] Edital nao disponivel para download: {num_con} — continuando analise sem ele.")
+        return False
+
+    # Guardar o caminho do arquivo original para posterior envio
+    lic["edital_pdf_path"] = download["filepath"]
+    lic["edital_disponivel"] = True
+
+    async with _edital_semaphore:
+        #  6. Anlise profunda do edital 
+        # Unzip + PyMuPDF são síncronos: numa thread, o event loop segue com as chamadas à IA
+        edital_data = await asyncio.to_thread(process_edital_download, download["filepath"])
+
+        if not (edital_data["success"] and edital_data["combined_text"]):
+            return False
+
+        analysis = await analyze_edital(
+            objeto=lic.get("objeto", ""),
+            edital_text=edital_data["combined_text"],
+            orgao=lic.get("orgao", ""),
+            cidade_uf=lic.get("cidade", ""),
+        )
+
+    # Atualizar dados da licitacao com a analise profunda
+    lic["analise_completa"] = analysis
+    lic["resumo_ia"] = analysis.get("resumo_executivo", "")
+    lic["recomendacao"] = analysis.get("recomendacao", "ACOMPANHAR")
+    lic["aderencia"] = analysis.get("aderencia", lic["aderencia"]) # Atualizar se for diferente
+    return True
+
+
 async def process_boletim(
     boletim_number: int | None = None,
     boletim_url: str | None = None,
@@ -34,6 +106,7 @@ async def process_boletim(
     email_html: str = "",
     download_all_alta: bool = True,
     send_whatsapp: bool = True,
+    use_batch_api: bool = False,
 ) -> dict:
     """
     Pipeline completo de processamento de um boletim.
@@ -55,6 +128,7 @@ async def process_boletim(
         email_html: HTML do e-mail (para extrair URL)
         download_all_alta: Se True, baixa editais de todas as Alta aderncia
         send_whatsapp: Se True, envia relatrio via WhatsApp
+        use_batch_api: Se True, faz a triagem via OpenAI Batch API (mais barato, mais lento)
         
     Returns: Dict com resultado completo do pipeline
     """
@@ -87,7 +161,7 @@ async def process_boletim(
         logger.info("[SCRAPE] Etapa 2: Login e obtencao de dados...")
         
         async with ConLicitacaoScraper() as scraper:
-            if not await scraper.login():
+            if not await scraper.ensure_logged_in():
                 result["errors"].append("Falha no login do ConLicitacao")
                 logger.error("[ERR] Pipeline abortado: Falha no login")
                 return result
@@ -124,12 +198,13 @@ async def process_boletim(
 
             #  4. Pre-triagem rpida (GPT-4o-mini) 
             logger.info(f"[AI] Etapa 4: Triagem de {len(licitacoes)} licitacoes...")
-            licitacoes = await batch_triage(licitacoes)
+            if use_batch_api:
+                licitacoes, counts = await batch_triage_via_batch_api(licitacoes)
+            else:
+                licitacoes, counts = await batch_triage(licitacoes)
 
             # Contagem
-            for lic in licitacoes:
-                aderencia = lic.get("aderencia", "BAIXA")
-                result["triagem"][aderencia.lower()] += 1
+            result["triagem"] = {"alta": counts["ALTA"], "media": counts["MEDIA"], "baixa": counts["BAIXA"]}
 
             logger.info(
                 f" Triagem: [ALTA] {result['triagem']['alta']} | "
@@ -150,61 +225,44 @@ async def process_boletim(
                     # Remover duplicatas
                     alta_ids = list(dict.fromkeys(alta_ids))
                     
-                    # Ao baixar ALTA, marcar como favorito no portal
-                    downloads = await scraper.download_editais_batch(alta_ids, favorite=True)
+                    # Ao baixar ALTA, marcar como favorito no portal. DOWNLOAD_SAME_PAGE troca as
+                    # abas paralelas (com retry) pela página do boletim com transferências sobrepostas
+                    if config.DOWNLOAD_SAME_PAGE:
+                        downloads = await scraper.download_editais_for_boletim(alta_ids, favorite=True)
+                    else:
+                        downloads = await scraper.download_editais_batch(alta_ids, favorite=True)
                     result["editais_baixados"] = sum(1 for d in downloads if d["success"])
 
                     #  6. Anlise profunda dos editais 
                     logger.info("[AI] Etapa 6: Analise profunda dos editais baixados...")
                     # Note: O zip assume que a ordem dos downloads corresponde aos alta_ids, 
-                    # entao precisamos garantir que o download_editais_batch mantenha a ordem ou retorne um mapa.
-                    # No scraper atual, ele retorna uma lista na mesma ordem dos IDs.
+                    # entao precisamos garantir que o download em lote mantenha a ordem ou retorne um mapa.
+                    # No scraper atual, os dois modos retornam uma lista na mesma ordem dos IDs.
                     
                     # Vamos mapear os resultados de volta para as licitacoes de alta
                     download_map = {d["id"]: d for d in downloads}
-                    
-                    for lic in alta_licitacoes:
-                        num_con = lic.get("numero_conlicitacao")
-                        download = download_map.get(num_con)
-                        
-                        if download and download["success"] and download["filepath"]:
-                            # Guardar o caminho do arquivo original para posterior envio
-                            lic["edital_pdf_path"] = download["filepath"]
-                            lic["edital_disponivel"] = True
-                            
-                            #  6. Anlise profunda do edital 
-                            edital_data = process_edital_download(download["filepath"])
-                            
-                            if edital_data["success"] and edital_data["combined_text"]:
-                                analysis = await analyze_edital(
-                                    objeto=lic.get("objeto", ""),
-                                    edital_text=edital_data["combined_text"],
-                                    orgao=lic.get("orgao", ""),
-                                    cidade_uf=lic.get("cidade", ""),
-                                )
-                                # Atualizar dados da licitacao com a analise profunda
-                                lic["analise_completa"] = analysis
-                                lic["resumo_ia"] = analysis.get("resumo_executivo", "")
-                                lic["recomendacao"] = analysis.get("recomendacao", "ACOMPANHAR")
-                                lic["aderencia"] = analysis.get("aderencia", lic["aderencia"]) # Atualizar se for diferente
-                                result["editais_analisados"] += 1
-                        else:
-                            # Edital não disponível para download — anotar e continuar
-                            lic["edital_disponivel"] = False
-                            logger.info(f"[INFO] Edital nao disponivel para download: {num_con} — continuando analise sem ele.")
+
+                    # Parse + análise de cada edital em paralelo (limitado por MAX_CONCURRENT_EDITAIS)
+                    analyzed = await asyncio.gather(
+                        *(
+                            _process_one_alta(lic, download_map.get(lic.get("numero_conlicitacao")))
+                            for lic in alta_licitacoes
+                        ),
+                        return_exceptions=True,
+                    )
+                    for lic, ok in zip(alta_licitacoes, analyzed):
+                        if isinstance(ok, Exception):
+                            logger.error(f"[ERR] Erro ao analisar edital {lic.get('numero_conlicitacao')}: {ok}")
+                        elif ok:
+                            result["editais_analisados"] += 1
             else:
                 logger.info("[SKIP] Etapa 5-6: Nenhum edital para download/anlise profunda")
 
         #  7. Verificar duplicatas e salvar no banco 
         logger.info("[DATABASE] Etapa 7: Salvando no banco de dados...")
-        licitacoes_novas = []
-        for lic in licitacoes:
-            is_dup = await check_duplicate(
-                lic.get("edital", ""),
-                lic.get("numero_conlicitacao", ""),
-            )
-            if not is_dup:
-                licitacoes_novas.append(lic)
+        keys = [(lic.get("edital", ""), lic.get("numero_conlicitacao", "")) for lic in licitacoes]
+        duplicates = await check_duplicates_batch(keys)
+        licitacoes_novas = [lic for lic, key in zip(licitacoes, keys) if key not in duplicates]
 
         if licitacoes_novas:
             result["salvas_no_banco"] = await save_batch(licitacoes_novas)
@@ -216,7 +274,7 @@ async def process_boletim(
             # Enviar apenas Alta e Mdia
             licitacoes_report = [l for l in licitacoes if l.get("aderencia") != "BAIXA"]
             if licitacoes_report:
-                result["whatsapp_enviado"] = send_report(
+                result["whatsapp_enviado"] = await send_report_async(
                     licitacoes_report,
                     boletim_number,
                     total_no_boletim=result["total_licitacoes"],
@@ -237,37 +295,33 @@ async def process_boletim(
                 # Localizar os PDFs a enviar:
                 # 1. Se for PDF direto → usar diretamente
                 # 2. Se for ZIP → a pasta extraída tem o mesmo nome sem .zip
-                pdf_candidates = []
+                # sizes: caminho → tamanho (só arquivos regulares existentes)
+                sizes = {}
 
-                if raw_path.lower().endswith(".pdf") and os.path.isfile(raw_path):
-                    pdf_candidates = [raw_path]
+                if is_pdf(raw_path) and os.path.isfile(raw_path):
+                    sizes = _stat_sizes([raw_path])
                 else:
                     extract_dir = os.path.splitext(raw_path)[0]
-                    if os.path.isdir(extract_dir):
-                        for root, _, files in os.walk(extract_dir):
-                            for f in files:
-                                if f.lower().endswith(".pdf"):
-                                    pdf_candidates.append(os.path.join(root, f))
-
-                    if not pdf_candidates and os.path.isfile(raw_path):
+                    extracted = get_extracted_files(extract_dir)
+                    if extracted is not None:
+                        # Já listado pelo extract_zip nesta execução
+                        sizes = _stat_sizes(f for f in extracted if is_pdf(f))
+                    elif os.path.isdir(extract_dir):
+                        sizes = dict(_scan_pdfs(extract_dir))
+
+                    if not sizes and os.path.isfile(raw_path):
                         # ZIP ainda não foi extraído — processar agora
                         edital_data = process_edital_download(raw_path)
-                        pdf_candidates = edital_data.get("pdf_files", [])
+                        sizes = _stat_sizes(edital_data.get("pdf_files", []))
 
-                if not pdf_candidates:
+                if not sizes:
                     logger.warning(f"[WHATSAPP] Nenhum PDF encontrado para {edital_label}, pulando envio.")
                     continue
 
                 # Ordenar por tamanho (maior primeiro) e limitar a 5 arquivos para evitar spam
-                pdf_candidates = sorted(
-                    pdf_candidates, 
-                    key=lambda p: os.path.getsize(p) if os.path.isfile(p) else 0, 
-                    reverse=True
-                )[:5]
+                pdf_candidates = sorted(sizes, key=sizes.get, reverse=True)[:5]
 
                 for pdf_to_send in pdf_candidates:
-                    if not os.path.isfile(pdf_to_send):
-                        continue
 
                     filename = os.path.basename(pdf_to_send)
                     caption = f"📎 Edital {edital_label} — {filename}".strip(" —")
@@ -0,0 +1,98 @@
+"""
+Controle proativo de taxa para a API da OpenAI.
+Mantém um balde de requisições (RPM) e outro de tokens (TPM) por modelo,
+no padrão do api_request_parallel_processor do openai-cookbook.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+
+import tiktoken
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Balde de capacidade por minuto para requisições e tokens."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._available_requests = float(requests_per_minute)
+        self._available_tokens = float(tokens_per_minute)
+        self._last_update = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        """Repõe a capacidade proporcional ao tempo decorrido desde a última leitura."""
+        now = time.monotonic()
+        elapsed = now - self._last_update
+        self._last_update = now
+        self._available_requests = min(
+            self.requests_per_minute,
+            self._available_requests + self.requests_per_minute * elapsed / 60,
+        )
+        self._available_tokens = min(
+            self.tokens_per_minute,
+            self._available_tokens + self.tokens_per_minute * elapsed / 60,
+        )
+
+    async def acquire(self, n_tokens: int, n_requests: int = 1):
+        """
+        Aguarda até haver capacidade para a chamada e a debita dos baldes.
+
+        Args:
+            n_tokens: Tokens estimados da chamada (prompt + max_tokens)
+            n_requests: Número de requisições
+        """
+        # Uma chamada maior que o balde inteiro nunca caberia — limita ao máximo
+        n_tokens = min(n_tokens, self.tokens_per_minute)
+
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._available_requests >= n_requests and self._available_tokens >= n_tokens:
+                    self._available_requests -= n_requests
+                    self._available_tokens -= n_tokens
+                    return
+
+                missing_requests = max(0.0, n_requests - self._available_requests)
+                missing_tokens = max(0.0, n_tokens - self._available_tokens)
+                wait = max(
+                    missing_requests * 60 / self.requests_per_minute,
+                    missing_tokens * 60 / self.tokens_per_minute,
+                )
+                logger.debug(f"[RATE] Aguardando {wait:.2f}s por capacidade da OpenAI")
+                await asyncio.sleep(wait)
+
+
+_buckets: dict[str, TokenBucket] = {}
+
+
+def get_bucket(model: str) -> TokenBucket:
+    """Retorna o balde do modelo (um por modelo, criado sob demanda)."""
+    if model not in _buckets:
+        rpm, tpm = config.OPENAI_RATE_LIMITS.get(model, config.OPENAI_RATE_LIMITS_DEFAULT)
+        _buckets[model] = TokenBucket(rpm, tpm)
+    return _buckets[model]
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """Retorna o tokenizer do modelo (cacheado)."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def estimate_tokens(model: str, messages: list[dict], max_tokens: int = 0) -> int:
+    """Estima os tokens que a chamada consome do TPM (prompt + saída máxima)."""
+    encoding = get_encoding(model)
+    # ~4 tokens de overhead por mensagem (papel + delimitadores)
+    prompt_tokens = sum(len(encoding.encode(m.get("content") or "")) + 4 for m in messages)
+    return prompt_tokens + max_tokens
@@ -8,14 +8,271 @@ import logging
 import os
 import random
 import re
+import shutil
+import time
 from datetime import datetime
 
-from playwright.async_api import async_playwright, Page, Browser, BrowserContext
+from playwright.async_api import Page, Browser, BrowserContext, Download
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
-from . import config
+from . import browser_pool, config
 
 logger = logging.getLogger(__name__)
 
+# Tokenizer HTML em C (selectolax) para ler os links do e-mail; senão, regex sobre os hrefs
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+# Opções comuns a todos os contextos (principal e abas de download em paralelo)
+_CONTEXT_OPTIONS = {
+    "viewport": {"width": config.VIEWPORT_WIDTH, "height": config.VIEWPORT_HEIGHT},
+    "user_agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/122.0.0.0 Safari/537.36"
+    ),
+    "locale": "pt-BR",
+    "timezone_id": "America/Sao_Paulo",
+    "accept_downloads": True,
+}
+
+# Uniões de seletores (uma consulta ao DOM em vez de uma sondagem por seletor).
+# text="..." vira :text-is("..."), que o Playwright aceita dentro de listas CSS.
+LOGGED_IN_SELECTOR = ", ".join([
+    ':text-is("Dashboard")',
+    ':text-is("Ferramentas")',
+    ':text-is("Boletins de Licitaes")',
+    ':text-is("Boas-vindas")',
+    ':text-is("Encontrar Licitaes")',
+    'a:has-text("Dashboard")',
+    'a:has-text("Ferramentas")',
+])
+
+CLOSE_MODAL_SELECTOR = ", ".join([
+    ':text-is("Usar a plataforma")',
+    'button:has-text("Usar a plataforma")',
+    'span:has-text("Usar a plataforma")',
+    'button.close',
+    '.MuiDialog-root [class*="close"]',
+    '.modal-header .close',
+    'button[aria-label="close"]',
+    '[class*="CloseButton"]',
+    'button:has-text("Fechar")',
+    'span:has-text("Fechar")',
+    '.modal-content .close',
+    'button:has-text("Entendi")',
+    'div[role="presentation"] button:has-text("Fechar")',
+    'button svg[data-testid="CloseIcon"]',  # Comum em MUI
+])
+
+BOLETIM_LINK_SELECTOR = ", ".join([
+    'a.fc-daygrid-event',
+    'a.fc-event',
+    'a:has-text("Boletim")',
+    '.fc-daygrid-event a',
+])
+
+DOWNLOAD_BTN_SELECTOR = ", ".join([
+    'button:has-text("Baixar Edital")', 'a:has-text("Baixar Edital")',
+    'button:has-text("Visualizar Edital")', 'a:has-text("Visualizar Edital")',
+    'button:has-text("Download")', 'a:has-text("Download")',
+    'button:has-text("Arquivos")', 'a:has-text("Arquivos")',
+    '[title*="Baixar"]', '[aria-label*="Baixar"]',
+    '[title*="Edital"]', '[aria-label*="Edital"]',
+    '.btn-download', '[class*="download"]', 'a[href*="edital"]', 'a[href*="download"]',
+])
+
+# Após expandir o card, aceita também rótulos genéricos
+DOWNLOAD_BTN_EXPANDED_SELECTOR = f'{DOWNLOAD_BTN_SELECTOR}, :text-is("Baixar"), :text-is("Edital")'
+
+EXPAND_SELECTOR = ", ".join([
+    ':text-is("Ver mais")', ':text-is("Detalhes")', ':text-is("informações")',
+    'button:has-text("Exibir")', 'button:has-text("Mais")',
+    '[class*="expand"]', '[class*="details"]', '[aria-label*="expandir"]',
+    '[class*="MuiAccordionSummary"]', '[class*="MuiButton-root"]:has-text("mais")',
+])
+
+_DIALOG_SELECTOR = '[role="dialog"], [aria-modal="true"], .modal.show, .MuiDialog-root'
+
+# Localiza o botão de download do card em uma única chamada: procura por rótulo
+# (em ordem de prioridade) ou href; se não houver, expande o card e espera o botão
+# aparecer por até `timeout` ms. O elemento escolhido recebe _DOWNLOAD_MARK.
+_DOWNLOAD_MARK = "data-indflow-download"
+_FIND_DOWNLOAD_JS = """
+async (card, timeout) => {
+    const RANK = [/baixar/, /download/, /arquivos/, /edital/, /visualizar/];
+    const label = el => (el.innerText || el.title || el.getAttribute('aria-label') || '').toLowerCase();
+    const visible = el => el.offsetParent !== null;
+    const find = () => {
+        const els = Array.from(card.querySelectorAll('a, button, [role="button"]')).filter(visible);
+        for (const re of RANK) {
+            const el = els.find(e => re.test(label(e)));
+            if (el) return el;
+        }
+        return els.find(e => /edital|download/i.test(e.getAttribute('href') || ''));
+    };
+
+    let btn = find();
+    let expanded = false;
+    if (!btn) {
+        const expander = Array.from(card.querySelectorAll('button, [role="button"], [class*="MuiAccordionSummary"]'))
+            .find(el => visible(el) && /ver mais|detalhes|exibir|mais|informa|expandir/.test(label(el)));
+        if (expander) {
+            expander.click();
+            expanded = true;
+            const deadline = Date.now() + timeout;
+            while (!(btn = find()) && Date.now() < deadline) {
+                await new Promise(r => setTimeout(r, 100));
+            }
+        }
+    }
+    if (!btn) return {found: false, expanded};
+    btn.setAttribute('""" + _DOWNLOAD_MARK + """', '1');
+    return {found: true, expanded, href: btn.getAttribute('href') || ''};
+}
+"""
+
+# Extrai os campos de todos os cards da página (argumento: selector do card).
+# Padrão do portal: div.d-flex > div.bidding-info-title (rótulo) + div.flex-grow-1 > div (valor).
+# Os seletores legados de objeto e nº ConLicitação entram como fallback dentro do próprio JS.
+_SCRAPE_CARDS_JS = """
+sel => Array.from(document.querySelectorAll(sel)).map(el => {
+    // Rótulo -> valor numa única passada pelas linhas do card (a primeira ocorrência vence)
+    const fields = [];
+    for (const row of el.querySelectorAll('.d-flex')) {
+        const title = row.querySelector('.bidding-info-title');
+        const val = row.querySelector('.flex-grow-1');
+        if (title && val) fields.push([title.textContent, val.innerText.trim()]);
+    }
+    function getFieldValue(...labels) {
+        const hit = fields.find(([title]) => labels.some(l => title.includes(l)));
+        return hit ? hit[1] : '';
+    }
+    function firstText(selectors, accept) {
+        for (const s of selectors) {
+            const node = el.querySelector(s);
+            const t = node ? node.innerText.trim() : '';
+            if (t && accept(t)) return t;
+        }
+        return '';
+    }
+    const isNumCon = t => /^\\d{6,}$/.test(t);
+
+    // Número ConLicitação — rodapé do card
+    let numCon = '';
+    for (const s of el.querySelectorAll('span')) {
+        if (isNumCon(s.textContent.trim())) {
+            numCon = s.textContent.trim();
+            break;
+        }
+    }
+    numCon = numCon
+        || (el.innerText.match(/N[º°].*Conlicita..o:\\s*(\\d+)/i) || [])[1]
+        || firstText(['.number-cnl + span', '.number-cnl', '[class*="cnl"]'], isNumCon);
+
+    return {
+        objeto: getFieldValue('Objeto')
+            || firstText(['.buMCfY', 'p.card-text', '.objeto', '[class*="objeto"]'], t => t.length > 10),
+        orgao: getFieldValue('rgão', 'Orgao', 'Órgão'),
+        edital: getFieldValue('Edital'),
+        num_con: numCon || '',
+        data_abertura: getFieldValue('Prazo', 'bertura', 'Datas'),
+    };
+})
+"""
+
+# Acha e clica o botão "próxima página" numa única ida ao browser (argumento: selector do card).
+# Retorna o texto do primeiro card antes do clique, ou null se não há próxima página.
+# Ordem de preferência igual à dos antigos seletores Playwright (:has-text virou filtro por texto).
+_CLICK_NEXT_PAGE_JS = """
+sel => {
+    const visible = el => !!el && el.getClientRects().length > 0;
+    const links = Array.from(
+        document.querySelectorAll('ul.pagination li.page-item:not(.disabled) a')
+    ).filter(visible);
+    const byText = t => links.find(a => a.innerText.toLowerCase().includes(t));
+    const next = links.find(a => (a.getAttribute('aria-label') || '').includes('xt'))
+        || byText('>') || byText('»') || byText('próxima') || byText('proxima')
+        || [
+            'ul.pagination li:not(.disabled) > a[rel="next"]',
+            'button[aria-label*="next" i]:not([disabled])',
+            'nav[aria-label*="pagination" i] button:last-child:not([disabled])',
+        ].map(s => document.querySelector(s)).find(visible);
+    if (!next) return null;
+    const first = document.querySelector(sel);
+    const prev = first ? first.innerText : '';
+    next.scrollIntoView();
+    next.click();
+    return prev;
+}
+"""
+
+# Troca de página na SPA: verdadeiro quando o primeiro card deixa de ter o texto anterior
+_FIRST_CARD_CHANGED_JS = """
+([sel, prev]) => {
+    const el = document.querySelector(sel);
+    return !!el && el.innerText !== prev;
+}
+"""
+
+FAV_SELECTOR = 'button[title*="Gerenciar"], .fa-star, [class*="star"]'
+
+
+# Regexes usadas em loops de scraping, compiladas uma vez no import
+_BOLETIM_NUM_RE = re.compile(r'Boletim\s+(\d+)')
+_FIRST_NUMBER_RE = re.compile(r'(\d+)')
+_HREF_RE = re.compile(r'href="([^"]*)"', re.I)
+
+# Recursos descartados quando config.BLOCK_ASSETS está ligado. CSS só entra com
+# BLOCK_STYLESHEETS: sem ele, is_visible() e os modais do portal deixam de ser confiáveis.
+_BLOCKED_RESOURCE_TYPES = frozenset(
+    {"image", "font", "media"} | ({"stylesheet"} if config.BLOCK_STYLESHEETS else set())
+)
+_BLOCKED_URL_RE = re.compile(
+    "|".join([
+        r"google-analytics\.com",
+        r"googletagmanager\.com",
+        r"doubleclick\.net",
+        r"hotjar\.(?:com|io)",
+        r"connect\.facebook\.net",
+        r"clarity\.ms",
+        r"hs-analytics\.net",
+        r"nr-data\.net",
+    ]),
+    re.I,
+)
+
+
+async def _persist_download(download: Download, filepath: str):
+    """
+    Move o arquivo do diretório temporário do Playwright para filepath (rename, sem cópia).
+    Cai para shutil.move entre discos e para save_as quando o browser é remoto (CDP).
+    """
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    try:
+        src = await download.path()
+    except Exception:
+        await download.save_as(filepath)
+        return
+    try:
+        os.replace(src, filepath)
+    except OSError:
+        shutil.move(src, filepath)
+
+
+async def _first_visible(root, selector: str):
+    """
+    Retorna o primeiro elemento visível de selector (união de seletores) sob root, ou None.
+    O filtro de visibilidade roda no browser (visible=true): uma única consulta, sem
+    is_visible() por candidato.
+    """
+    loc = root.locator(f"{selector} >> visible=true")
+    n = await loc.count()
+    logger.debug(f"{n} visíveis para {selector!r}")
+    return loc.first if n else None
+
 
 class ConLicitacaoScraper:
     """Scraper para a plataforma ConLicitao usando Playwright."""
@@ -24,57 +281,93 @@ class ConLicitacaoScraper:
         self.browser: Browser | None = None
         self.context: BrowserContext | None = None
         self.page: Page | None = None
-        self._playwright = None
+        self._has_slot = False  # Vaga reservada no browser_pool
         self.current_boletim_number = None  # Capturado durante navegação
+        self._storage_state: dict | None = None  # Sessão do login, reaproveitada pelos contextos de download
+        self._session_restored = False  # Contexto criado a partir do storage_state salvo em disco
+        self._logged_in = False
+        self._modal_closed = False  # Modal de boas-vindas já fechado nesta sessão
+        self._last_card_sel: str | None = None  # Selector de card que funcionou na última página
+        self._favorited: set[str] = set()  # IDs já favoritados (o botão alterna: clicar de novo desfaz)
+        self._licitacao_url_template: str | None = None  # Deep link descoberto ("" = indisponível)
 
     async def __aenter__(self):
-        await self.start()
+        try:
+            await self.start()
+        except BaseException:
+            await self.close()  # Não deixa a vaga do pool presa se o start falhar
+            raise
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.close()
 
     async def start(self):
-        """Inicia o browser e contexto Playwright."""
-        self._playwright = await async_playwright().start()
-        self.browser = await self._playwright.chromium.launch(
-            headless=True,
-            args=[
-                "--no-sandbox",
-                "--disable-dev-shm-usage",
-                "--disable-blink-features=AutomationControlled",
-            ],
-        )
-        self.context = await self.browser.new_context(
-            viewport={"width": 1366, "height": 768},
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/122.0.0.0 Safari/537.36"
-            ),
-            locale="pt-BR",
-            timezone_id="America/Sao_Paulo",
-            accept_downloads=True,
-        )
+        """Obtém o browser compartilhado e abre um contexto próprio (isolado) para este scraper."""
+        await browser_pool.acquire()
+        self._has_slot = True
+        self.browser = await browser_pool.get_browser()
+
+        # Garantir que os diretórios de downloads existem (XLSX, ZIPs e prints de debug)
+        config.ensure_dirs()
+
+        # Sessão salva na execução anterior, se ainda dentro do TTL
+        storage_state = None
+        try:
+            age = time.time() - os.path.getmtime(config.STORAGE_STATE_PATH)
+            if age < config.STORAGE_STATE_TTL:
+                storage_state = config.STORAGE_STATE_PATH
+        except OSError:
+            pass
+        self._session_restored = storage_state is not None
+
+        self.context = await self._new_context(storage_state)
         self.page = await self.context.new_page()
         
-        # Garantir que o diretório de downloads existe para prints de debug
-        os.makedirs(config.DOWNLOADS_DIR, exist_ok=True)
-        
-        logger.info("Browser iniciado com sucesso")
+        logger.info(f"Contexto iniciado com sucesso{' (sessão restaurada)' if self._session_restored else ''}")
+
+    async def _new_context(self, storage_state: str | dict | None = None) -> BrowserContext:
+        """Cria um contexto no browser compartilhado, já com o filtro de recursos pesados."""
+        context = await self.browser.new_context(**_CONTEXT_OPTIONS, storage_state=storage_state)
+        # Falhar rápido: só as esperas realmente longas (downloads, XLSX) sobrescrevem por chamada
+        context.set_default_timeout(config.DEFAULT_TIMEOUT_MS)
+        context.set_default_navigation_timeout(config.NAV_TIMEOUT_MS)
+        if config.BLOCK_ASSETS:
+            await context.route("**/*", self._route_filter)
+        return context
+
+    async def _route_filter(self, route):
+        """Aborta imagens/fontes/mídia e rastreadores; o fluxo só precisa de DOM, XHR e downloads."""
+        request = route.request
+        if request.resource_type in _BLOCKED_RESOURCE_TYPES or _BLOCKED_URL_RE.search(request.url):
+            await route.abort()
+        else:
+            await route.continue_()
 
     async def close(self):
-        """Fecha o browser e libera recursos."""
-        if self.context:
-            await self.context.close()
-        if self.browser:
-            await self.browser.close()
-        if self._playwright:
-            await self._playwright.stop()
-        logger.info("Browser fechado")
+        """
+        Fecha o contexto (persistindo a sessão para a próxima execução) e libera a vaga no pool.
+        O browser compartilhado continua aberto para os próximos scrapers.
+        """
+        try:
+            if self.context:
+                if self._logged_in:
+                    try:
+                        await self.context.storage_state(path=config.STORAGE_STATE_PATH)
+                    except Exception as e:
+                        logger.warning(f"Não foi possível salvar a sessão: {e}")
+                await self.context.close()
+                self.context = None
+        finally:
+            if self._has_slot:
+                browser_pool.release()
+                self._has_slot = False
+        logger.info("Contexto fechado")
 
     async def _delay(self):
-        """Delay humanizado entre aes."""
+        """Delay humanizado entre aes (apenas com config.HUMANIZE; em produção é no-op)."""
+        if not config.HUMANIZE:
+            return
         delay = random.uniform(config.SCRAPING_DELAY_MIN, config.SCRAPING_DELAY_MAX)
         await asyncio.sleep(delay)
 
@@ -91,11 +384,10 @@ class ConLicitacaoScraper:
             await self.page.goto(
                 config.CONLICITACAO_URL,
                 wait_until="domcontentloaded",
-                timeout=45000,
             )
             
-            # Esperar um pouco para o React assentar
-            await asyncio.sleep(5)
+            # Aguardar o formulário do React renderizar (em vez de um sleep fixo)
+            await self.page.wait_for_selector('input[name="login"], input#login, input[type="email"]')
             await self._delay()
 
             # Tirar print inicial do formulário vazio
@@ -119,25 +411,24 @@ class ConLicitacaoScraper:
             btn = self.page.locator('button:has-text("Acessar"), input[type="submit"], .btn-primary').first
             await btn.click()
             
-            # Aguardar transição (SPA)
-            await asyncio.sleep(5)
             await self.page.screenshot(path=os.path.join(config.DOWNLOADS_DIR, "login_3_after_click.png"))
 
             # Aguardar Dashboard ou erro
             try:
                 # Seletor do Dashboard ou elemento pós-login
-                await self.page.wait_for_selector('text="Dashboard", text="Sair", .MuiAvatar-root, text="Visualizar"', timeout=25000)
+                await self.page.wait_for_selector('text="Dashboard", text="Sair", .MuiAvatar-root, text="Visualizar"')
             except:
                 logger.warning("Aguardando Dashboard demorou mais que o esperado. Verificando estado final...")
                 await self.page.screenshot(path=os.path.join(config.DOWNLOADS_DIR, "login_4_wait_timeout.png"))
 
             if await self._is_logged_in():
                 logger.info("[OK] Login realizado com sucesso!")
+                self._logged_in = True
                 return True
             
             # Verificar se há mensagem de erro explícita na tela
             error_box = self.page.locator('.alert-danger, .MuiAlert-message, text="inválido", text="Incorreto"').first
-            if await error_box.is_visible(timeout=2000):
+            if await error_box.is_visible():
                 txt = await error_box.inner_text()
                 logger.error(f"❌ Erro de login no portal: {txt}")
             
@@ -150,28 +441,36 @@ class ConLicitacaoScraper:
             except: pass
             return False
 
+    async def ensure_logged_in(self) -> bool:
+        """
+        Garante uma sessão autenticada: reaproveita o storage_state restaurado no start()
+        e só executa o login completo se a sessão salva não existir ou tiver expirado.
+        """
+        if self._session_restored:
+            try:
+                await self.page.goto(config.CONLICITACAO_URL, wait_until="domcontentloaded")
+                login_form = self.page.locator('input[name="senha"], input#senha, input[type="password"]')
+                dashboard = self.page.locator('a:has-text("Dashboard"), a:has-text("Ferramentas")')
+                await login_form.or_(dashboard).first.wait_for(state="visible")
+                if not await login_form.first.is_visible() and await self._is_logged_in():
+                    logger.info("[OK] Sessão salva reaproveitada, login dispensado.")
+                    self._logged_in = True
+                    return True
+            except Exception as e:
+                logger.debug(f"Sessão salva inválida: {e}")
+            logger.info("Sessão salva expirada. Fazendo login completo...")
+        return await self.login()
+
     async def _is_logged_in(self) -> bool:
         """Verifica se o usurio est logado checando elementos da pgina."""
         try:
-            # Indicadores reais do dashboard ConLicitao ps-login
-            indicators = [
-                'text="Dashboard"',
-                'text="Ferramentas"',
-                'text="Boletins de Licitaes"',
-                'text="Boas-vindas"',
-                'text="Encontrar Licitaes"',
-                'a:has-text("Dashboard")',
-                'a:has-text("Ferramentas")',
-            ]
-            for selector in indicators:
-                try:
-                    element = self.page.locator(selector).first
-                    if await element.is_visible(timeout=2000):
-                        return True
-                except Exception:
-                    continue
-        except Exception:
+            # Indicadores reais do dashboard ConLicitao ps-login: uma única espera sobre a união
+            await self.page.locator(LOGGED_IN_SELECTOR).first.wait_for(state="visible", timeout=2500)
+            return True
+        except PlaywrightTimeoutError:
             pass
+        except Exception as e:
+            logger.debug(f"Aviso ao verificar login: {e}")
 
         # Fallback: verificar se a URL mudou para algo ps-login
         current_url = self.page.url
@@ -180,56 +479,55 @@ class ConLicitacaoScraper:
     async def _close_welcome_modal(self):
         """
         Fecha o modal de boas-vindas e outros overlays se estiverem visveis.
+        O modal só aparece uma vez por sessão: depois de fechado, as chamadas seguintes são no-op.
         """
+        if self._modal_closed:
+            return
         try:
+            dialogs = self.page.locator(_DIALOG_SELECTOR)
+            if await dialogs.count() == 0:
+                return
+
             # Tentar fechar vrias vezes se necessrio
             for _ in range(2):
-                close_selectors = [
-                    'text="Usar a plataforma"',
-                    'button:has-text("Usar a plataforma")',
-                    'span:has-text("Usar a plataforma")',
-                    'button.close',
-                    '.MuiDialog-root [class*="close"]',
-                    '.modal-header .close',
-                    'button[aria-label="close"]',
-                    '[class*="CloseButton"]',
-                    'button:has-text("Fechar")',
-                    'span:has-text("Fechar")',
-                    '.modal-content .close',
-                    'button:has-text("Entendi")',
-                    'div[role="presentation"] button:has-text("Fechar")',
-                    'button svg[data-testid="CloseIcon"]', # Comum em MUI
-                ]
-                
                 modal_found = False
-                for sel in close_selectors:
-                    try:
-                        el = self.page.locator(sel).first
-                        if await el.is_visible(timeout=1000):
-                            await el.click(force=True)
-                            logger.info(f"Modal fechado via selector: {sel}")
-                            modal_found = True
-                            await asyncio.sleep(1)
-                            # Se fechou um, pode haver outro, mas vamos tentar o prximo na prxima iterao do loop externo
-                    except: continue
+                try:
+                    el = await _first_visible(self.page, CLOSE_MODAL_SELECTOR)
+                    if el:
+                        await el.click(force=True)
+                        logger.info("Modal fechado")
+                        modal_found = True
+                        try:
+                            await el.wait_for(state="hidden", timeout=2000)
+                        except Exception:
+                            pass
+                        # Se havia outro por baixo, a próxima iteração do loop externo o fecha
+                except Exception:
+                    pass
                 
                 # ESC como fallback universal
                 await self.page.keyboard.press("Escape")
-                await asyncio.sleep(1)
                 
                 # Se ainda houver modais (dialogs) abertos, tentar clicar no X genrico ou fora
-                dialogs = self.page.locator('[role="dialog"], [aria-modal="true"], .modal.show, .MuiDialog-root')
+                try:
+                    await dialogs.first.wait_for(state="detached", timeout=1000)
+                except Exception:
+                    pass
                 if await dialogs.count() > 0:
                     logger.info("Tentando fechar dialog residual...")
                     # Tenta clicar no boto X se houver na div presentation
                     generic_x = self.page.locator('button:has-text(""), button:has-text("x"), [aria-label*="fechar"], [class*="close"]').first
-                    if await generic_x.is_visible(timeout=1000):
+                    if await generic_x.is_visible():
                         await generic_x.click(force=True)
                     else:
                         # Clica no canto superior direito para tentar fechar se for um overlay sem boto detectado
                         await self.page.mouse.click(10, 10) # Clica no topo
-                    await asyncio.sleep(1)
+                    try:
+                        await dialogs.first.wait_for(state="detached", timeout=1000)
+                    except Exception:
+                        pass
                 else:
+                    self._modal_closed = True
                     break
 
         except Exception as e:
@@ -249,92 +547,140 @@ class ConLicitacaoScraper:
             calendar_url = f"{config.CONLICITACAO_URL}/boletim_web/public/boletins"
             logger.info(f"Acessando calendário de boletins: {calendar_url}")
             
-            await self.page.goto(calendar_url, wait_until="domcontentloaded", timeout=45000)
-            await asyncio.sleep(8) 
-            
+            await self.page.goto(calendar_url, wait_until="domcontentloaded")
+
             try:
-                await self.page.wait_for_selector('.fc-view-harness, .fc-daygrid-event, a:has-text("Boletim")', timeout=15000)
+                await self.page.wait_for_selector('.fc-view-harness, .fc-daygrid-event, a:has-text("Boletim")')
             except:
                 logger.warning("Calendário não detectado via seletores padrão. Verificando links...")
 
-            # 3. Localizar links de boletins
-            loc = self.page.locator('a.fc-daygrid-event, a.fc-event, a:has-text("Boletim"), .fc-daygrid-event a')
-            count = await loc.count()
+            # 3. Localizar links de boletins (texto + href de todos em uma única ida ao browser)
+            loc = self.page.locator(BOLETIM_LINK_SELECTOR)
+            rows = await loc.evaluate_all("""
+                els => els.map(e => ({
+                    t: (e.innerText || '').replace(/\\s+/g, ' ').trim(),
+                    h: e.getAttribute('href') || ''
+                }))
+            """)
             
-            if count == 0:
+            if not rows:
                 debug_path = os.path.join(config.DOWNLOADS_DIR, "debug_no_bulletins.png")
                 await self.page.screenshot(path=debug_path)
                 logger.error(f"Nenhum boletim encontrado no calendário. Screenshot: {debug_path}")
                 return False
 
-            texts = await loc.all_inner_texts()
-            links_data = []
-            for i in range(count):
-                txt = " ".join(texts[i].split())
-                if "Boletim" in txt:
-                    links_data.append({"index": i, "text": txt, "locator": loc.nth(i)})
+            links_data = [
+                {
+                    "index": i,
+                    "text": row["t"],
+                    "href": row["h"],
+                    "number": int(m.group(1)) if (m := _BOLETIM_NUM_RE.search(row["t"])) else None,
+                }
+                for i, row in enumerate(rows)
+                if "Boletim" in row["t"]
+            ]
 
             if not links_data:
                 logger.error("Elementos encontrados mas nenhum contém o texto 'Boletim'")
                 return False
 
-            # 4. Escolher o boletim
+            # 4. Escolher o boletim (o pedido ou, na falta dele, o de maior número)
             target_item = None
             if boletim_number:
-                target_str = f"Boletim {boletim_number}"
-                for item in links_data:
-                    if target_str.lower() in item["text"].lower():
-                        target_item = item
-                        break
+                target_item = next((item for item in links_data if item["number"] == boletim_number), None)
             
             if not target_item:
-                max_val = -1
-                for item in links_data:
-                    match = re.search(r'Boletim\s+(\d+)', item["text"])
-                    if match:
-                        num = int(match.group(1))
-                        if num > max_val:
-                            max_val = num
-                            target_item = item
-                if not target_item: target_item = links_data[0]
+                numbered = [item for item in links_data if item["number"] is not None]
+                target_item = max(numbered, key=lambda item: item["number"]) if numbered else links_data[0]
 
             # 5. Clicar
             logger.info(f"Clicando no boletim: '{target_item['text']}'")
-            match = re.search(r'Boletim\s+(\d+)', target_item['text'])
-            if match: self.current_boletim_number = int(match.group(1))
+            if target_item["number"] is not None:
+                self.current_boletim_number = target_item["number"]
 
-            await target_item['locator'].click()
-            await asyncio.sleep(5)
-            await self.page.wait_for_load_state("domcontentloaded", timeout=20000)
-            await asyncio.sleep(2)
+            await loc.nth(target_item["index"]).click()
+            await self._wait_boletim_ready(self.page)
             return True
 
         except Exception as e:
             logger.error(f"Erro ao navegar ao boletim: {e}", exc_info=True)
             return False
 
+    async def _wait_boletim_ready(self, page: Page, timeout: int = 20000) -> bool:
+        """
+        Aguarda o boletim renderizar: contador "Total de N licitações" ou o primeiro card.
+        networkidle fica só como fallback, pois sempre soma ~500ms de ociosidade da rede.
+        """
+        ready = page.locator(r'text=/Total de \d+ licita/').or_(page.locator(".card-body, .MuiPaper-root")).first
+        try:
+            await ready.wait_for(state="visible", timeout=timeout)
+            return True
+        except Exception:
+            logger.warning("Boletim não detectado via seletores. Aguardando rede ociosa...")
+            try:
+                await page.wait_for_load_state("networkidle", timeout=10000)
+            except Exception:
+                pass
+            return False
+
+    async def _wait_cards_replaced(self, card_selector: str, old_first: str, timeout: int = 15000):
+        """
+        Aguarda a SPA trocar os cards após clicar em "próxima página" (texto do primeiro
+        card diferente do anterior). networkidle só entra se a troca não for detectada.
+        """
+        try:
+            await self.page.wait_for_function(
+                _FIRST_CARD_CHANGED_JS, arg=[card_selector, old_first], timeout=timeout
+            )
+        except PlaywrightTimeoutError:
+            logger.warning("Troca de cards não detectada. Aguardando rede ociosa...")
+            try:
+                await self.page.wait_for_load_state("networkidle", timeout=10000)
+            except Exception:
+                pass
+
+    async def _scroll_until_stable(self, page: Page, max_iters: int = 10) -> int:
+        """
+        Rola até o fim da página enquanto o conteúdo cresce (lazy-load da SPA).
+        Para assim que a altura deixa de aumentar em 1,5s, sem pausa fixa no final.
+        Returns: Número de rolagens que carregaram conteúdo novo
+        """
+        grew = 0
+        for _ in range(max_iters):
+            height = await page.evaluate(
+                "() => { const h = document.body.scrollHeight; window.scrollTo(0, h); return h; }"
+            )
+            try:
+                await page.wait_for_function("h => document.body.scrollHeight > h", arg=height, timeout=1500)
+            except PlaywrightTimeoutError:
+                break
+            grew += 1
+        return grew
+
     async def navigate_to_boletim_url(self, url: str) -> bool:
         """
         Navega diretamente a uma URL de boletim (ex: vinda do e-mail).
         """
         try:
             logger.info(f"Navegando à URL do boletim: {url}")
-            await self.page.goto(url, wait_until="domcontentloaded", timeout=45000)
-            await asyncio.sleep(5)
+            await self.page.goto(url, wait_until="domcontentloaded")
 
             if "login" in self.page.url.lower():
                 logger.info("Redirecionado para login, autenticando...")
                 if not await self.login(): return False
-                await self.page.goto(url, wait_until="domcontentloaded", timeout=45000)
-                await asyncio.sleep(5)
+                await self.page.goto(url, wait_until="domcontentloaded")
+            await self._wait_boletim_ready(self.page)
             return True
         except Exception as e:
             logger.error(f"Erro ao navegar à URL do boletim: {e}")
             return False
 
-    async def export_xlsx(self, boletim_number=None, boletim_url=None) -> str | None:
+    async def export_xlsx(self, boletim_number=None, boletim_url=None, force: bool = False) -> str | None:
         """
         Exporta o XLSX do boletim atual. Signature compatível com pipeline.py.
+        Um XLSX já exportado do mesmo boletim (dentro de XLSX_TTL) é reaproveitado sem
+        clicar em "Gerar .xlsx"; force=True ignora o cache. A navegação acontece mesmo
+        assim, pois os downloads de edital partem da página do boletim.
         """
         try:
             if boletim_url:
@@ -342,6 +688,16 @@ class ConLicitacaoScraper:
             elif boletim_number and self.current_boletim_number != boletim_number:
                 await self.navigate_to_boletim(boletim_number)
 
+            number = self.current_boletim_number or boletim_number
+            filepath = os.path.join(config.XLSX_DIR, f"boletim_{number or 'export'}.xlsx")
+            if number and not force:
+                try:
+                    if time.time() - os.path.getmtime(filepath) < config.XLSX_TTL:
+                        logger.info(f"[CACHE] XLSX do boletim {number} reaproveitado: {filepath}")
+                        return filepath
+                except OSError:
+                    pass
+
             logger.info("Iniciando exportação XLSX...")
             xlsx_btn_selector = 'button:has-text("Gerar .xlsx"), a:has-text("Gerar .xlsx"), .btn:has-text("Gerar .xlsx"), text="Gerar .xlsx"'
             
@@ -351,17 +707,21 @@ class ConLicitacaoScraper:
             except:
                 logger.warning("Botão XLSX não visível. Rolando...")
                 await self._close_welcome_modal()
-                await self.page.mouse.wheel(0, 3000)
-                await asyncio.sleep(3)
+                await self._scroll_until_stable(self.page)
                 btn = self.page.locator(xlsx_btn_selector).first
+                await btn.wait_for(state="attached", timeout=10000)
+
+            # O botão nasce desabilitado enquanto o boletim carrega os dados
+            try:
+                await self.page.wait_for_function("btn => !btn.disabled", arg=await btn.element_handle(), timeout=20000)
+            except Exception:
+                logger.warning("Botão XLSX segue desabilitado. Tentando clicar mesmo assim...")
 
             async with self.page.expect_download(timeout=90000) as download_info:
                 await btn.click(force=True)
                 
             download = await download_info.value
-            filename = f"boletim_{self.current_boletim_number or 'export'}.xlsx"
-            filepath = os.path.join(config.XLSX_DIR, filename)
-            await download.save_as(filepath)
+            await _persist_download(download, filepath)
             logger.info(f"[OK] XLSX salvo em: {filepath}")
             return filepath
         except Exception as e:
@@ -370,123 +730,159 @@ class ConLicitacaoScraper:
 
     async def download_edital(self, numero_conlicitacao: str, favorite: bool = False) -> str | None:
         """
-        Download de edital individual com estratégias robustas de expansão e detecção.
+        Download de edital individual na página principal.
         """
         try:
-            logger.info(f"Baixando edital da licitação {numero_conlicitacao}...")
-            
-            # 1. Localizar o ID na página (com suporte a paginação)
-            found = False
-            for _ in range(5): 
-                if await self.page.get_by_text(numero_conlicitacao, exact=True).is_visible(timeout=3000):
-                    found = True
-                    break
-                next_btn = self.page.locator('ul.pagination li:not(.disabled) a:has-text(">"), [aria-label*="xt"], button:has-text(">")').first
-                if await next_btn.is_visible(timeout=1000):
-                    logger.info("ID não encontrado nesta página, avançando...")
-                    await next_btn.click()
-                    await asyncio.sleep(4)
-                else: break
-            
-            if not found:
-                logger.warning(f"ID {numero_conlicitacao} não localizado em nenhuma página.")
-                return None
-
-            # 2. Isolar o card container
-            card = self.page.get_by_text(numero_conlicitacao, exact=True).locator("xpath=./ancestor::div[contains(@class,'MuiPaper-root') or contains(@class,'card') or contains(@class,'bidding')][1]")
-            await card.scroll_into_view_if_needed()
-            await asyncio.sleep(1)
-
-            # 3. Favoritar se solicitado
-            if favorite: 
-                await self.mark_as_favorite_in_card(card, numero_conlicitacao)
-
-            # 4. Localizar botão de download (múltiplos seletores)
-            download_selectors = [
-                'button:has-text("Baixar Edital")', 'a:has-text("Baixar Edital")',
-                'button:has-text("Visualizar Edital")', 'a:has-text("Visualizar Edital")',
-                'button:has-text("Baixar edital")', 'a:has-text("Baixar edital")',
-                'button:has-text("Download")', 'a:has-text("Download")',
-                'button:has-text("Arquivos")', 'a:has-text("Arquivos")',
-                '[title*="Baixar"]', '[aria-label*="Baixar"]',
-                '[title*="Edital"]', '[aria-label*="Edital"]',
-                '.btn-download', '[class*="download"]', 'a[href*="edital"]', 'a[href*="download"]'
-            ]
-            
-            btn = None
-            for sel in download_selectors:
-                el = card.locator(sel).first
-                if await el.is_visible(timeout=800):
-                    btn = el
-                    break
+            return await self._download_edital_on_page(self.page, numero_conlicitacao, favorite)
+        except Exception as e:
+            logger.error(f"Falha em download_edital {numero_conlicitacao}: {e}")
+            return None
 
-            # 5. Se não visível, tentar expandir o card
-            if not btn:
-                logger.info(f"Botão não visível para {numero_conlicitacao}, tentando expandir card...")
-                expand_selectors = [
-                    'text="Ver mais"', 'text="Detalhes"', 'text="informações"',
-                    'button:has-text("Exibir")', 'button:has-text("Mais")',
-                    '[class*="expand"]', '[class*="details"]', '[aria-label*="expandir"]', 
-                    '[class*="MuiAccordionSummary"]', '[class*="MuiButton-root"]:has-text("mais")'
-                ]
-                for ex_sel in expand_selectors:
-                    ex_btn = card.locator(ex_sel).first
-                    if await ex_btn.is_visible(timeout=800):
-                        await ex_btn.click(force=True)
-                        logger.info(f"Expansão via: {ex_sel}")
-                        await asyncio.sleep(7) # Tempo maior para SPA
-                        break
-                
-                # Checar novamente após expansão com seletores de texto mais genéricos
-                for sel in download_selectors + ['text="Baixar"', 'text="Edital"']:
-                    el = card.locator(sel).first
-                    if await el.is_visible(timeout=1500):
-                        btn = el
-                        break
-
-            # Fallback 2: Tentar encontrar via JS se os seletores Playwright falharem
-            if not btn:
-                logger.info(f"Tentando localização via JS para {numero_conlicitacao}...")
-                btn_handle = await card.evaluate_handle("""
-                    card => {
-                        const links = Array.from(card.querySelectorAll('a, button, [role="button"]'));
-                        return links.find(el => {
-                            const txt = (el.innerText || el.title || el.ariaLabel || "").toLowerCase();
-                            return txt.includes('baixar') || txt.includes('edital') || txt.includes('download') || txt.includes('visualizar');
-                        });
-                    }
-                """)
-                if btn_handle.as_element():
-                    btn = btn_handle.as_element()
-                    logger.info("Botão localizado via JS fallback!")
-
-            if not btn:
-                logger.warning(f"Não foi possível localizar o botão de download para {numero_conlicitacao}")
-                # Print de debug para ver o estado do card
-                debug_path = os.path.join(config.DOWNLOADS_DIR, f"debug_dl_fail_{numero_conlicitacao}.png")
-                await card.screenshot(path=debug_path)
-                return None
+    async def _download_edital_on_page(self, page: Page, numero_conlicitacao: str, favorite: bool = False) -> str | None:
+        """
+        Download de edital individual na página informada (principal ou aba de um contexto de download).
+        Returns: Caminho do arquivo, ou None se o card/botão não foi encontrado.
+        Raises: Erros do Playwright (timeout, navegação) — transitórios, quem chama decide se repete
+        """
+        download = await self._start_download(page, numero_conlicitacao, favorite)
+        if download is None:
+            return None
+        return await self._save_download(download, numero_conlicitacao)
 
-            # 6. Executar download
-            await btn.scroll_into_view_if_needed()
-            await asyncio.sleep(1)
-            
-            download_dir = os.path.join(config.ZIP_DIR, f"edital_{numero_conlicitacao}")
-            os.makedirs(download_dir, exist_ok=True)
+    async def _start_download(self, page: Page, numero_conlicitacao: str, favorite: bool = False) -> Download | None:
+        """
+        Localiza o card (estratégias robustas de expansão e detecção) e clica no botão de download.
+        Retorna assim que o download começa; a transferência fica com _save_download.
+        None só quando o ID, o card ou o botão não existem; timeouts e falhas
+        de navegação propagam para que o chamador possa repetir.
+        """
+        logger.info(f"Baixando edital da licitação {numero_conlicitacao}...")
+        
+        # 1. Localizar o ID na página (deep link e, na falta dele, paginação)
+        found = (
+            await page.get_by_text(numero_conlicitacao, exact=True).first.is_visible()
+            or await self._goto_licitacao(page, numero_conlicitacao)
+        )
+        for _ in range(0 if found else 5): 
+            if await page.get_by_text(numero_conlicitacao, exact=True).is_visible():
+                found = True
+                break
+            next_btn = page.locator('ul.pagination li:not(.disabled) a:has-text(">"), [aria-label*="xt"], button:has-text(">")').first
+            if await next_btn.is_visible():
+                logger.info("ID não encontrado nesta página, avançando...")
+                await next_btn.click()
+                try:
+                    await page.get_by_text(numero_conlicitacao, exact=True).first.wait_for(state="visible", timeout=4000)
+                except Exception:
+                    pass
+            else: break
+        
+        if not found:
+            logger.warning(f"ID {numero_conlicitacao} não localizado em nenhuma página.")
+            return None
 
-            logger.info(f"Iniciando captura de download para {numero_conlicitacao}...")
-            async with self.page.expect_download(timeout=90000) as download_info:
-                await btn.click(force=True)
-                download = await download_info.value
-                filepath = os.path.join(download_dir, download.suggested_filename)
-                await download.save_as(filepath)
-                logger.info(f"[OK] Download concluído: {filepath}")
-                return filepath
+        # 2. Isolar o card container
+        card = page.get_by_text(numero_conlicitacao, exact=True).locator("xpath=./ancestor::div[contains(@class,'MuiPaper-root') or contains(@class,'card') or contains(@class,'bidding')][1]")
+        if await card.count() == 0:
+            logger.warning(f"Card da licitação {numero_conlicitacao} não encontrado.")
+            return None
+        await card.scroll_into_view_if_needed()
+
+        # 3. Favoritar se solicitado (uma vez só: numa nova tentativa o clique desfaria o favorito)
+        if favorite and numero_conlicitacao not in self._favorited:
+            if await self.mark_as_favorite_in_card(card, numero_conlicitacao):
+                self._favorited.add(numero_conlicitacao)
+
+        # 4. Localizar (e, se preciso, expandir o card para achar) o botão de download
+        #    numa única ida ao browser; o elemento encontrado fica marcado no DOM
+        probe = await card.evaluate(_FIND_DOWNLOAD_JS, 7000)
+        if probe.get("expanded"):
+            logger.info(f"Card {numero_conlicitacao} expandido")
+        btn = card.locator(f"[{_DOWNLOAD_MARK}]").first if probe.get("found") else None
+
+        # 5. Fallback: seletores Playwright (:has-text, title/aria-label e classes)
+        if not btn:
+            logger.info(f"Botão não localizado via JS para {numero_conlicitacao}, tentando seletores...")
+            if not probe.get("expanded"):
+                ex_btn = await _first_visible(card, EXPAND_SELECTOR)
+                if ex_btn:
+                    await ex_btn.click(force=True)
+                    logger.info(f"Card {numero_conlicitacao} expandido")
+                    # Aguarda a SPA renderizar algum botão de download no card expandido
+                    try:
+                        await card.locator(DOWNLOAD_BTN_EXPANDED_SELECTOR).first.wait_for(state="visible", timeout=7000)
+                    except Exception:
+                        pass
+            btn = await _first_visible(card, DOWNLOAD_BTN_EXPANDED_SELECTOR)
 
-        except Exception as e:
-            logger.error(f"Falha em download_edital {numero_conlicitacao}: {e}")
+        if not btn:
+            logger.warning(f"Não foi possível localizar o botão de download para {numero_conlicitacao}")
+            # Print de debug para ver o estado do card
+            debug_path = os.path.join(config.DOWNLOADS_DIR, f"debug_dl_fail_{numero_conlicitacao}.png")
+            try:
+                await card.screenshot(path=debug_path)
+            except Exception:
+                pass
             return None
 
+        # 6. Disparar download
+        await btn.scroll_into_view_if_needed()
+
+        logger.info(f"Iniciando captura de download para {numero_conlicitacao}...")
+        async with page.expect_download(timeout=90000) as download_info:
+            await btn.click(force=True)
+        return await download_info.value
+
+    async def _save_download(self, download: Download, numero_conlicitacao: str) -> str | None:
+        """
+        Aguarda a transferência e grava o arquivo em ZIP_DIR/edital_<id>/.
+        Falhas (download cancelado, disco) propagam para o chamador.
+        """
+        download_dir = os.path.join(config.ZIP_DIR, f"edital_{numero_conlicitacao}")
+        os.makedirs(download_dir, exist_ok=True)
+        filepath = os.path.join(download_dir, download.suggested_filename)
+        await _persist_download(download, filepath)
+        logger.info(f"[OK] Download concluído: {filepath}")
+        return filepath
+
+    async def _goto_licitacao(self, page: Page, numero_conlicitacao: str) -> bool:
+        """
+        Abre a licitação por deep link (uma navegação) em vez de paginar o boletim.
+        O primeiro template de config.LICITACAO_URL_TEMPLATES que funcionar fica memorizado;
+        se nenhum funcionar, o deep link é desligado até o fim da sessão.
+        Returns: True se o ID ficou visível na página
+        """
+        if self._licitacao_url_template == "" or not config.LICITACAO_URL_TEMPLATES:
+            return False
+
+        origin_url = page.url
+        boletim_url = origin_url.split("?", 1)[0]
+        templates = [self._licitacao_url_template] if self._licitacao_url_template else config.LICITACAO_URL_TEMPLATES
+        target = page.get_by_text(numero_conlicitacao, exact=True).first
+
+        for template in templates:
+            url = template.format(boletim_url=boletim_url, id=numero_conlicitacao)
+            try:
+                response = await page.goto(url, wait_until="domcontentloaded")
+                if response is not None and not response.ok:
+                    continue
+                await target.wait_for(state="visible", timeout=8000)
+                if self._licitacao_url_template is None:
+                    logger.info(f"Deep link de licitação descoberto: {template}")
+                self._licitacao_url_template = template
+                return True
+            except Exception:
+                continue
+
+        if self._licitacao_url_template is None:
+            logger.info("Deep link de licitação indisponível. Usando paginação...")
+            self._licitacao_url_template = ""
+
+        # Volta ao boletim para a paginação tradicional
+        await page.goto(origin_url, wait_until="domcontentloaded")
+        await self._wait_boletim_ready(page)
+        return False
+
     async def mark_as_favorite(self, numero_conlicitacao: str) -> bool:
         """Favoritar licitação."""
         try:
@@ -497,26 +893,142 @@ class ConLicitacaoScraper:
     async def mark_as_favorite_in_card(self, card, numero_conlicitacao: str) -> bool:
         """Marca favorito no card."""
         try:
-            fav_btn = card.locator('button[title*="Gerenciar"], .fa-star, [class*="star"]').first
-            if await fav_btn.is_visible(timeout=1000):
+            fav_btn = await _first_visible(card, FAV_SELECTOR)
+            if fav_btn:
                 await fav_btn.click(force=True)
                 logger.info(f"Favoritada: {numero_conlicitacao}")
                 return True
             return False
         except: return False
 
-    async def download_editais_batch(self, ids: list[str], favorite: bool = False) -> list[dict]:
-        """Download em lote."""
+    async def download_editais_batch(
+        self,
+        ids: list[str],
+        favorite: bool = False,
+        max_concurrency: int = config.DOWNLOAD_CONCURRENCY,
+    ) -> list[dict]:
+        """
+        Download em lote, com até max_concurrency abas isoladas em paralelo.
+        As abas saem de um pool: cada uma é criada uma vez (contexto próprio, sessão do
+        login via storage_state) e reaproveitada nos editais seguintes; o semáforo
+        garante que nunca haja mais abas abertas que vagas no pool.
+        Returns: Lista de resultados na mesma ordem de ids
+        """
+        if not ids:
+            return []
+
+        boletim_url = self.page.url
+        self._storage_state = await self.context.storage_state()
+        sem = asyncio.BoundedSemaphore(max_concurrency)
+        idle_pages: list[Page] = []
+        all_contexts: list[BrowserContext] = []
+
+        async def _checkout_page() -> Page:
+            if idle_pages:
+                return idle_pages.pop()
+            context = await self._new_context(self._storage_state)
+            all_contexts.append(context)
+            return await context.new_page()
+
+        async def _download_one(lid: str) -> str | None:
+            async with sem:
+                # Falhas de navegação (timeout, rate-limit do portal) são repetidas com backoff
+                # exponencial; "card/botão não encontrado" volta None e não é repetido
+                for attempt in range(config.DOWNLOAD_RETRIES + 1):
+                    page = await _checkout_page()
+                    try:
+                        await page.goto(boletim_url, wait_until="domcontentloaded")
+                        await self._wait_boletim_ready(page)
+                        path = await self._download_edital_on_page(page, lid, favorite)
+                        idle_pages.append(page)
+                        await self._delay()
+                        return path
+                    except Exception as e:
+                        # Aba em estado incerto: descarta o contexto, a próxima tentativa cria outro
+                        all_contexts.remove(page.context)
+                        await page.context.close()
+                        if attempt == config.DOWNLOAD_RETRIES:
+                            raise
+                        wait = 2 ** attempt
+                        logger.warning(f"Download de {lid} falhou ({e}). Nova tentativa em {wait}s...")
+                        await asyncio.sleep(wait)
+
+        logger.info(f"Baixando {len(ids)} editais (até {max_concurrency} em paralelo)...")
+        try:
+            paths = await asyncio.gather(*(_download_one(lid) for lid in ids), return_exceptions=True)
+        finally:
+            for context in all_contexts:
+                await context.close()
+
         results = []
+        for lid, path in zip(ids, paths):
+            if isinstance(path, Exception):
+                logger.error(f"Falha em download_edital {lid}: {path}")
+                path = None
+            results.append({"id": lid, "filepath": path, "success": path is not None})
+        return results
+
+    async def download_editais_for_boletim(
+        self,
+        ids: list[str],
+        favorite: bool = False,
+        max_concurrency: int = config.SAME_PAGE_DOWNLOADS,
+    ) -> list[dict]:
+        """
+        Download em lote na própria página do boletim, sem abrir novos contextos.
+        Localizar e clicar é sequencial (a página é uma só); a transferência de cada
+        arquivo corre em paralelo com a localização dos próximos, até max_concurrency.
+        Returns: Lista de resultados na mesma ordem de ids
+        """
+        sem = asyncio.Semaphore(max_concurrency)
+
+        async def _save(download: Download, lid: str) -> str | None:
+            try:
+                return await self._save_download(download, lid)
+            finally:
+                sem.release()
+
+        saves: dict[str, asyncio.Task] = {}
         for lid in ids:
-            path = await self.download_edital(lid, favorite); results.append({"id": lid, "filepath": path, "success": path is not None})
-            await self._delay()
+            await sem.acquire()
+            try:
+                download = await self._start_download(self.page, lid, favorite)
+            except Exception as e:
+                logger.error(f"Falha em download_edital {lid}: {e}")
+                download = None
+            if download is None:
+                sem.release()
+                continue
+            saves[lid] = asyncio.create_task(_save(download, lid))
+
+        paths = dict(zip(saves, await asyncio.gather(*saves.values(), return_exceptions=True)))
+        results = []
+        for lid in ids:
+            path = paths.get(lid)
+            if isinstance(path, Exception):
+                logger.error(f"Falha em download_edital {lid}: {path}")
+                path = None
+            results.append({"id": lid, "filepath": path, "success": path is not None})
         return results
 
     async def get_boletim_url_from_email(self, email_html: str) -> str | None:
-        """Extrai URL do boletim do HTML."""
-        match = re.search(r'href="([^"]*(?:boletim|visualizar)[^"]*)"', email_html, re.I)
-        return match.group(1) if match else None
+        """
+        Extrai URL do boletim do HTML numa única varredura dos hrefs (selectolax, se instalado).
+        Prefere o primeiro link de boletim/visualizar; na falta dele, o primeiro link absoluto do ConLicitação.
+        """
+        if HTMLParser is not None:
+            hrefs = (a.attributes.get("href") or "" for a in HTMLParser(email_html).css("a[href]"))
+        else:
+            hrefs = (match.group(1) for match in _HREF_RE.finditer(email_html))
+
+        fallback = None
+        for href in hrefs:
+            low = href.lower()
+            if "boletim" in low or "visualizar" in low:
+                return href
+            if fallback is None and "conlicitacao" in low and low.startswith("http"):
+                fallback = href
+        return fallback
 
     async def scrape_bulletin_cards(self) -> tuple[list[dict], int | None]:
         """
@@ -526,6 +1038,7 @@ class ConLicitacaoScraper:
         Returns: (lista_de_licitacoes, numero_do_boletim)
         """
         licitacoes = []
+        seen: set[str] = set()  # Nº ConLicitação já coletados (o portal repete cards entre páginas)
         boletim_number = self.current_boletim_number
         try:
             logger.info("Iniciando scraping manual dos cards...")
@@ -534,9 +1047,9 @@ class ConLicitacaoScraper:
             total_esperado = None
             try:
                 total_el = self.page.locator(r'text=/Total de \d+ licita/')
-                if await total_el.is_visible(timeout=5000):
+                if await total_el.is_visible():
                     total_text = await total_el.inner_text()
-                    m = re.search(r'(\d+)', total_text)
+                    m = _FIRST_NUMBER_RE.search(total_text)
                     if m:
                         total_esperado = int(m.group(1))
                         logger.info(f"Total esperado no boletim: {total_esperado} licitações")
@@ -553,34 +1066,26 @@ class ConLicitacaoScraper:
                 '[class*="item-licitacao"]',
             ]
 
-            # Selectors para "próxima página"
-            NEXT_PAGE_SELECTORS = [
-                'ul.pagination li.page-item:not(.disabled) a[aria-label*="xt"]',
-                'ul.pagination li.page-item:not(.disabled) a:has-text(">") ',
-                'ul.pagination li.page-item:not(.disabled) a:has-text("»")',
-                'ul.pagination li.page-item:not(.disabled) a:has-text("Próxima")',
-                'ul.pagination li.page-item:not(.disabled) a:has-text("Proxima")',
-                'ul.pagination li:not(.disabled) > a[rel="next"]',
-                'button[aria-label*="next" i]:not([disabled])',
-                'nav[aria-label*="pagination" i] button:last-child:not([disabled])',
-            ]
-
             page_num = 1
             max_pages = 20  # Segurança
 
             while page_num <= max_pages:
                 logger.info(f"Scrapeando pagina {page_num} de cards...")
 
-                # Descobrir qual selector de card funciona nesta página
+                # Descobrir qual selector de card funciona nesta página: o vencedor da página
+                # anterior é testado primeiro (espera longa); os demais só com espera curta
+                probe_order = [self._last_card_sel] if self._last_card_sel else []
+                probe_order += [sel for sel in CARD_SELECTORS if sel != self._last_card_sel]
                 card_selector = None
                 card_count = 0
-                for sel in CARD_SELECTORS:
+                for n, sel in enumerate(probe_order):
                     try:
-                        await self.page.wait_for_selector(sel, timeout=8000)
+                        await self.page.wait_for_selector(sel, timeout=8000 if n == 0 else 1000)
                         cnt = await self.page.locator(sel).count()
                         if cnt > 0:
                             card_selector = sel
                             card_count = cnt
+                            self._last_card_sel = sel
                             break
                     except Exception:
                         continue
@@ -591,128 +1096,37 @@ class ConLicitacaoScraper:
 
                 logger.info(f"Encontrados {card_count} cards na pagina {page_num} (selector: {card_selector})")
 
-                for i in range(card_count):
-                    card = self.page.locator(card_selector).nth(i)
-                    try:
-                        # Extrair campos via JavaScript — usa padrão label+sibling do portal
-                        # Estrutura: div.d-flex > div.bidding-info-title (rótulo) + div.flex-grow-1 > div (valor)
-                        fields = await card.evaluate("""
-                            el => {
-                                function getFieldValue(labelText) {
-                                    const rows = el.querySelectorAll('.d-flex');
-                                    for (const row of rows) {
-                                        const title = row.querySelector('.bidding-info-title');
-                                        if (title && title.textContent.includes(labelText)) {
-                                            const val = row.querySelector('.flex-grow-1');
-                                            if (val) return val.innerText.trim();
-                                        }
-                                    }
-                                    return '';
-                                }
-                                // Número ConLicitação — rodapé do card
-                                let numCon = '';
-                                const spans = el.querySelectorAll('span');
-                                for (const s of spans) {
-                                    if (/^\\d{6,}$/.test(s.textContent.trim())) {
-                                        numCon = s.textContent.trim();
-                                        break;
-                                    }
-                                }
-                                return {
-                                    objeto: getFieldValue('Objeto'),
-                                    orgao:  getFieldValue('rgão') || getFieldValue('Orgao') || getFieldValue('Órgão'),
-                                    edital: getFieldValue('Edital'),
-                                    num_con: numCon || (el.innerText.match(/N[º°].*Conlicita..o:\\s*(\\d+)/i) || [])[1]
-                                };
-                            }
-                        """)
-
-                        objeto  = (fields.get("objeto")  or "").strip()
-                        orgao   = (fields.get("orgao")   or "").strip()
-                        edital  = (fields.get("edital")  or "").strip()
-                        num_con = (fields.get("num_con") or "").strip()
-
-                        # Fallbacks legados se JS não capturou
-                        if not objeto:
-                            for obj_sel in ['.buMCfY', 'p.card-text', '.objeto', '[class*=\"objeto\"]']:
-                                try:
-                                    el = card.locator(obj_sel).first
-                                    if await el.is_visible(timeout=300):
-                                        t = (await el.inner_text()).strip()
-                                        if len(t) > 10:
-                                            objeto = t
-                                            break
-                                except Exception:
-                                    continue
-
-                        if not num_con:
-                            for num_sel in ['.number-cnl + span', '.number-cnl', '[class*=\"cnl\"]']:
-                                try:
-                                    el = card.locator(num_sel).first
-                                    if await el.is_visible(timeout=300):
-                                        t = (await el.inner_text()).strip()
-                                        if re.match(r'^\d{6,}$', t):
-                                            num_con = t
-                                            break
-                                except Exception:
-                                    continue
-
-                        # Data de abertura
-                        data_abertura = ""
-                        try:
-                            da_fields = await card.evaluate("""
-                                el => {
-                                    const rows = el.querySelectorAll('.d-flex');
-                                    for (const row of rows) {
-                                        const title = row.querySelector('.bidding-info-title');
-                                        if (title && (title.textContent.includes('Prazo') || title.textContent.includes('bertura') || title.textContent.includes('Datas'))) {
-                                            const val = row.querySelector('.flex-grow-1');
-                                            if (val) return val.innerText.trim();
-                                        }
-                                    }
-                                    return '';
-                                }
-                            """)
-                            data_abertura = (da_fields or "").strip()
-                        except Exception:
-                            pass
-
-                        if not objeto and not num_con:
+                # Todos os cards da página numa única ida ao browser
+                rows = await self.page.evaluate(_SCRAPE_CARDS_JS, card_selector)
+                for row in rows:
+                    objeto  = (row.get("objeto")  or "").strip()
+                    num_con = (row.get("num_con") or "").strip()
+                    if not objeto and not num_con:
+                        continue
+                    if num_con:
+                        if num_con in seen:
                             continue
-
-                        licitacoes.append({
-                            "edital": edital,
-                            "objeto": objeto,
-                            "orgao": orgao.replace("info", "").strip(),
-                            "numero_conlicitacao": num_con,
-                            "data_abertura": data_abertura,
-                        })
-                    except Exception as e:
-                        logger.warning(f"Erro ao extrair card {i} na pagina {page_num}: {e}")
+                        seen.add(num_con)
+                    licitacoes.append({
+                        "edital": (row.get("edital") or "").strip(),
+                        "objeto": objeto,
+                        "orgao": (row.get("orgao") or "").replace("info", "").strip(),
+                        "numero_conlicitacao": num_con,
+                        "data_abertura": (row.get("data_abertura") or "").strip(),
+                    })
 
                 # Parar cedo se já temos todos
                 if total_esperado and len(licitacoes) >= total_esperado:
                     logger.info(f"[OK] Todos os {total_esperado} cards capturados.")
                     break
 
-                # Tentar ir para a próxima página
-                went_next = False
-                for next_sel in NEXT_PAGE_SELECTORS:
-                    try:
-                        next_btn = self.page.locator(next_sel).first
-                        if await next_btn.is_visible(timeout=1500):
-                            await next_btn.click()
-                            logger.info(f"Avançando para página {page_num + 1}...")
-                            await asyncio.sleep(5)
-                            await self.page.wait_for_load_state("networkidle", timeout=15000)
-                            went_next = True
-                            break
-                    except Exception:
-                        continue
-
-                if not went_next:
+                # Tentar ir para a próxima página (detecta e clica de uma vez)
+                old_first = await self.page.evaluate(_CLICK_NEXT_PAGE_JS, card_selector)
+                if old_first is None:
                     logger.info("Não há mais páginas de cards.")
                     break
+                logger.info(f"Avançando para página {page_num + 1}...")
+                await self._wait_cards_replaced(card_selector, old_first)
 
                 page_num += 1
 
@@ -732,7 +1146,7 @@ async def run_scraping_flow(
     Executa o fluxo completo de scraping com fallback manual.
     """
     async with ConLicitacaoScraper() as scraper:
-        if not await scraper.login():
+        if not await scraper.ensure_logged_in():
             return {"success": False, "error": "Falha no login"}
 
         if boletim_url:
@@ -763,6 +1177,6 @@ async def run_scraping_flow(
         }
 
         if download_ids:
-            result["downloads"] = await scraper.download_editais_batch(download_ids)
+            result["downloads"] = await scraper.download_editais_for_boletim(download_ids)
 
         return result
@@ -3,17 +3,72 @@ Módulo de envio de relatórios via WhatsApp (Evolution API).
 Formata e envia relatório priorizado de licitações.
 """
 
+import asyncio
+import functools
 import logging
 from datetime import datetime
 
 import base64
+import json
 import os
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from . import config
 
 logger = logging.getLogger(__name__)
 
+# Respostas transitórias da Evolution API que valem nova tentativa (com backoff)
+_RETRY_STATUSES = frozenset({429, 502, 503, 504})
+_SEND_RETRIES = 3
+_BACKOFF_FACTOR = 0.5
+
+_async_client: httpx.AsyncClient | None = None
+
+
+@functools.lru_cache(maxsize=1)
+def _session() -> requests.Session:
+    """
+    Sessão HTTP da Evolution API, criada sob demanda e reaproveitada por todos os envios
+    (keep-alive: um handshake TCP/TLS em vez de um por mensagem).
+    Rate-limit (429) e indisponibilidade momentânea (502/503/504) são repetidos com backoff.
+    """
+    retry = Retry(
+        total=_SEND_RETRIES,
+        backoff_factor=_BACKOFF_FACTOR,
+        status_forcelist=sorted(_RETRY_STATUSES),
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+    session.headers.update({"apikey": config.EVOLUTION_API_KEY})
+    return session
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Client HTTP assíncrono da Evolution API (singleton), para envios sem bloquear o event loop."""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            base_url=config.EVOLUTION_API_URL,
+            headers={"apikey": config.EVOLUTION_API_KEY},
+            limits=httpx.Limits(max_connections=8, max_keepalive_connections=4),
+            timeout=httpx.Timeout(30.0, connect=10.0),
+        )
+    return _async_client
+
+
+async def close_client():
+    """Fecha o pool de conexões com a Evolution API (shutdown do app)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
 
 def format_report(
     licitacoes: list[dict],
@@ -33,101 +88,107 @@ def format_report(
     boletim_str = f" — Boletim {boletim_number}" if boletim_number else ""
     header = f"📋 *Relatório IndFlow{boletim_str}*\n📅 {today}"
 
-    # Separar por aderência
-    alta  = [l for l in licitacoes if l.get("aderencia") == "ALTA"]
-    media = [l for l in licitacoes if l.get("aderencia") == "MEDIA"]
+    # Separar por aderência e contar documentos (apenas para ALTA) numa única passada
+    alta, media = [], []
+    com_doc = sem_doc = 0
+    for l in licitacoes:
+        aderencia = l.get("aderencia")
+        if aderencia == "ALTA":
+            alta.append(l)
+            disponivel = l.get("edital_disponivel")
+            com_doc += disponivel is True
+            sem_doc += disponivel is False
+        elif aderencia == "MEDIA":
+            media.append(l)
     baixa_count = (total_no_boletim or 0) - len(licitacoes) if total_no_boletim else 0
-
-    # Estatísticas de documentos (apenas para ALTA)
-    alta = [l for l in licitacoes if l.get("aderencia") == "ALTA"]
-    com_doc    = sum(1 for l in alta if l.get("edital_disponivel") is True)
-    sem_doc    = sum(1 for l in alta if l.get("edital_disponivel") is False)
     sem_info   = len(alta) - com_doc - sem_doc  # IA triage-only, sem tentativa de download
 
-    sections = []
+    # Saída montada numa lista plana de pedaços (cada um já com seus "\n" à esquerda)
+    # e unida uma única vez no final
+    out = [header]
 
     # Bloco de resumo
     total_str = f"/{total_no_boletim}" if total_no_boletim else ""
-    doc_line = ""
-    if com_doc or sem_doc:
-        doc_line = f"\n📄 Documentos: {com_doc} baixados | {sem_doc} indisponíveis no portal"
-    sections.append(
+    out.append(
         f"\n\n📊 *{len(licitacoes)}{total_str} licitaes relevantes* (de {total_no_boletim or len(licitacoes)} no boletím)"
         f"\n🟢 Alta: {len(alta)} | 🟡 Média: {len(media)} | 🔴 Baixa: {baixa_count} (filtradas)"
-        + doc_line
     )
+    if com_doc or sem_doc:
+        out.append(f"\n📄 Documentos: {com_doc} baixados | {sem_doc} indisponíveis no portal")
 
     # Alta aderência (detalhado)
     if alta:
-        sections.append("\n\n🟢 *ALTA ADERÊNCIA*")
+        out.append("\n\n\n🟢 *ALTA ADERÊNCIA*")
         for i, lic in enumerate(alta, 1):
-            sections.append(_format_licitacao_detail(i, lic))
+            _append_licitacao_detail(out, i, lic)
 
     # Média aderência (resumido)
     if media:
-        sections.append("\n\n🟡 *MÉDIA ADERÊNCIA*")
+        out.append("\n\n\n🟡 *MÉDIA ADERÊNCIA*")
         for i, lic in enumerate(media, 1):
-            sections.append(_format_licitacao_brief(i, lic))
+            _append_licitacao_brief(out, i, lic)
 
-    return header + "\n".join(sections)
+    return "".join(out)
 
 
-def _format_licitacao_detail(index: int, lic: dict) -> str:
-    """Formata uma licitação com detalhes (para Alta aderência)."""
+def _append_licitacao_detail(out: list[str], index: int, lic: dict):
+    """Acrescenta a out uma licitação com detalhes (para Alta aderência)."""
     num_con = lic.get('numero_conlicitacao', 'S/N')
     edital_name = lic.get('edital')
     
     # Título: Edital ou Fallback para Nº Conlicitação
     title = edital_name if edital_name else f"Nº Conlicitação: {num_con}"
-    lines = [f"\n\n*{index}. {title}*"]
+    out.append(f"\n\n\n*{index}. {title}*")
 
     # Se tivermos edital, colocar o Nº Conlicitação logo abaixo
     if edital_name:
-        lines.append(f"🆔 *Nº Conlicitação:* {num_con}")
+        out.append(f"\n🆔 *Nº Conlicitação:* {num_con}")
 
     # Link direto para a licitação no portal
     if num_con != 'S/N':
         link = f"https://consulteonline.conlicitacao.com.br/detalhes_licitacao?id={num_con}"
-        lines.append(f"🔗 {link}")
-
-    if lic.get("orgao"):
-        lines.append(f"📍 {lic['orgao']}")
-    if lic.get("cidade"):
-        cidade_uf = lic["cidade"]
-        if lic.get("uf"):
-            cidade_uf += f"/{lic['uf']}"
-        lines.append(f"📌 {cidade_uf}")
-
-    lines.append(f"📦 {lic.get('objeto', 'Sem descrição')[:150]}")
-
-    if lic.get("data_abertura"):
-        lines.append(f"📅 Abertura: {lic['data_abertura']}")
-    if lic.get("valor"):
-        lines.append(f"💰 {lic['valor']}")
+        out.append(f"\n🔗 {link}")
+
+    # Cada campo é lido do dict uma única vez
+    orgao = lic.get("orgao")
+    if orgao:
+        out.append(f"\n📍 {orgao}")
+    cidade = lic.get("cidade")
+    if cidade:
+        uf = lic.get("uf")
+        out.append(f"\n📌 {cidade}/{uf}" if uf else f"\n📌 {cidade}")
+
+    objeto = (lic.get("objeto") or "Sem descrição")[:150]
+    out.append(f"\n📦 {objeto}")
+
+    data_abertura = lic.get("data_abertura")
+    if data_abertura:
+        out.append(f"\n📅 Abertura: {data_abertura}")
+    valor = lic.get("valor")
+    if valor:
+        out.append(f"\n💰 {valor}")
 
     # Resumo IA (se disponível)
-    resumo = lic.get("resumo_ia", "")
+    resumo = lic.get("resumo_ia")
     if resumo:
-        lines.append(f"📝 _{resumo[:200]}_")
+        out.append(f"\n📝 _{resumo[:200]}_")
 
     # Nota: edital sem download disponível no portal
     if lic.get("edital_disponivel") is False:
-        lines.append("⚠️ _Edital não disponível para download no portal — análise baseada apenas na descrição do card._")
+        out.append("\n⚠️ _Edital não disponível para download no portal — análise baseada apenas na descrição do card._")
 
     # Recomendação
     rec = lic.get("recomendacao", "ACOMPANHAR")
     emoji = {"PARTICIPAR": "✅", "ACOMPANHAR": "👀", "DESCARTAR": "❌"}.get(rec, "❓")
-    lines.append(f"{emoji} *Recomendação: {rec}*")
+    out.append(f"\n{emoji} *Recomendação: {rec}*")
 
-    return "\n".join(lines)
 
 
-
-def _format_licitacao_brief(index: int, lic: dict) -> str:
-    """Formata uma licitação resumida (para Média aderência)."""
+def _append_licitacao_brief(out: list[str], index: int, lic: dict):
+    """Acrescenta a out uma licitação resumida (para Média aderência)."""
     num_con = lic.get("numero_conlicitacao", "S/N")
     objeto = lic.get("objeto") or "Sem descrição"
-    return f"\n{index}. Nº Conlicitação: {num_con}\n   📦 {objeto}"
+    out.append(f"\n\n{index}. Nº Conlicitação: {num_con}\n   📦 {objeto}")
 
 
 def send_whatsapp_message(message: str, recipient: str | None = None) -> bool:
@@ -146,16 +207,12 @@ def send_whatsapp_message(message: str, recipient: str | None = None) -> bool:
 
     try:
         url = f"{config.EVOLUTION_API_URL}/message/sendText/{config.EVOLUTION_INSTANCE}"
-        headers = {
-            "Content-Type": "application/json",
-            "apikey": config.EVOLUTION_API_KEY,
-        }
         payload = {
             "number": recipient,
             "text": message,
         }
 
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
+        response = _session().post(url, json=payload, timeout=30)
         response.raise_for_status()
 
         logger.info(f"[OK] Mensagem WhatsApp enviada para {recipient}")
@@ -180,26 +237,24 @@ def send_whatsapp_document(file_path: str, caption: str = "", recipient: str | N
         logger.error(f"[ERR] Arquivo não encontrado: {file_path}")
         return False
 
+    # Pré-validação pelo tamanho em disco: arquivo que a API recusaria nem é aberto/codificado
+    size = os.path.getsize(file_path)
+    if size > config.WHATSAPP_MAX_MEDIA_BYTES:
+        logger.error(f"[ERR] Documento grande demais para o WhatsApp ({size} bytes): {file_path}")
+        return False
+
     recipient = recipient or config.WHATSAPP_RECIPIENT
     if not recipient:
         logger.error("❌ Nenhum destinatário configurado para WhatsApp")
         return False
 
     try:
-        # Codificar arquivo em base64
-        with open(file_path, "rb") as f:
-            file_base64 = base64.b64encode(f.read()).decode("utf-8")
-
         url = f"{config.EVOLUTION_API_URL}/message/sendMedia/{config.EVOLUTION_INSTANCE}"
-        headers = {
-            "Content-Type": "application/json",
-            "apikey": config.EVOLUTION_API_KEY,
-        }
+        headers = {"Content-Type": "application/json"}
         
         filename = os.path.basename(file_path)
         payload = {
             "number": recipient,
-            "media": file_base64,
             "mediatype": "document",
             "mimetype": "application/pdf",
             "mediaType": "document",
@@ -207,7 +262,9 @@ def send_whatsapp_document(file_path: str, caption: str = "", recipient: str | N
             "caption": caption or f"Documento: {filename}",
         }
 
-        response = requests.post(url, json=payload, headers=headers, timeout=60)
+        # Base64 gerado em blocos durante o envio (memória O(bloco), não 3x o arquivo)
+        with _MediaBody(file_path, payload) as body:
+            response = _session().post(url, data=body, headers=headers, timeout=60)
         if response.status_code != 200:
             logger.error(f"[ERR] Falha ao enviar documento. Status: {response.status_code}, Resposta: {response.text}")
         response.raise_for_status()
@@ -220,6 +277,129 @@ def send_whatsapp_document(file_path: str, caption: str = "", recipient: str | N
         return False
 
 
+class _MediaBody:
+    """
+    Corpo JSON do sendMedia montado sob demanda: prefixo + base64 do arquivo + sufixo.
+    Expõe __len__ (Content-Length exato) e read(), então o requests transmite o corpo
+    em blocos sem carregar o arquivo inteiro; tell()/seek(0) permitem reenvio em retry.
+    """
+
+    _CHUNK = 57 * 1024  # Múltiplo de 3: os blocos base64 se concatenam sem padding no meio
+
+    def __init__(self, file_path: str, payload: dict, media_key: str = "media"):
+        head, tail = json.dumps({**payload, media_key: "\0"}).split('"\\u0000"')
+        self._head = (head + '"').encode()
+        self._tail = ('"' + tail).encode()
+        size = os.path.getsize(file_path)
+        self._len = len(self._head) + 4 * ((size + 2) // 3) + len(self._tail)
+        self._file = open(file_path, "rb")
+        self.seek(0)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if offset != 0 or whence != 0:
+            raise OSError("_MediaBody só volta ao início")
+        self._file.seek(0)
+        self._buf = self._head
+        self._done = False
+        self._pos = 0
+        return 0
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._done and (size < 0 or len(self._buf) < size):
+            chunk = self._file.read(self._CHUNK)
+            if chunk:
+                self._buf += base64.b64encode(chunk)
+            else:
+                self._buf += self._tail
+                self._done = True
+        if size < 0:
+            size = len(self._buf)
+        out, self._buf = self._buf[:size], self._buf[size:]
+        self._pos += len(out)
+        return out
+
+
+async def send_whatsapp_message_async(message: str, recipient: str | None = None) -> bool:
+    """
+    Versão assíncrona de send_whatsapp_message (httpx, sem bloquear o event loop).
+    
+    Args:
+        message: Texto da mensagem
+        recipient: Número do destinatário (padrão: config)
+    Returns: True se enviado com sucesso
+    """
+    recipient = recipient or config.WHATSAPP_RECIPIENT
+    if not recipient:
+        logger.error("❌ Nenhum destinatário configurado para WhatsApp")
+        return False
+
+    try:
+        url = f"/message/sendText/{config.EVOLUTION_INSTANCE}"
+        payload = {
+            "number": recipient,
+            "text": message,
+        }
+
+        for attempt in range(_SEND_RETRIES + 1):
+            response = await get_async_client().post(url, json=payload)
+            if response.status_code not in _RETRY_STATUSES or attempt == _SEND_RETRIES:
+                break
+            await asyncio.sleep(_BACKOFF_FACTOR * 2 ** attempt)
+        response.raise_for_status()
+
+        logger.info(f"[OK] Mensagem WhatsApp enviada para {recipient}")
+        return True
+
+    except Exception as e:
+        logger.error(f"[ERR] Erro ao enviar WhatsApp: {e}")
+        return False
+
+
+# WhatsApp tem limite de ~65k chars, mas msgs longas ficam ruins
+MAX_MESSAGE_LENGTH = 4000
+
+
+def _split_message(message: str) -> list[str]:
+    """Divide a mensagem em partes de até MAX_MESSAGE_LENGTH, quebrando em fim de linha."""
+    if len(message) <= MAX_MESSAGE_LENGTH:
+        return [message]
+
+    # Linhas acumuladas numa lista + tamanho corrente: cada parte é montada com um único
+    # join (O(n) no total), em vez de recopiar o prefixo a cada linha concatenada
+    # Linhas vazias no início de uma parte são descartadas (a parte nunca começa em "\n")
+    parts = []
+    lines: list[str] = []
+    size = 0  # == len("\n".join(lines))
+    for line in message.split("\n"):
+        if size + len(line) + 1 > MAX_MESSAGE_LENGTH:
+            parts.append("\n".join(lines))
+            lines, size = ([line], len(line)) if line else ([], 0)
+        elif lines:
+            lines.append(line)
+            size += len(line) + 1
+        elif line:
+            lines, size = [line], len(line)
+    if lines:
+        parts.append("\n".join(lines))
+
+    return [
+        part if i == 0 else f"📋 *Continuação ({i+1}/{len(parts)})*\n\n{part}"
+        for i, part in enumerate(parts)
+    ]
+
+
 def send_report(
     licitacoes: list[dict],
     boletim_number: int | None = None,
@@ -230,30 +410,21 @@ def send_report(
     Se a mensagem for muito longa, divide em partes.
     """
     message = format_report(licitacoes, boletim_number, total_no_boletim=total_no_boletim)
+    # all() pararia no primeiro erro; as partes seguintes devem sair mesmo assim
+    results = [send_whatsapp_message(part) for part in _split_message(message)]
+    return all(results)
 
-    # WhatsApp tem limite de ~65k chars, mas msgs longas ficam ruins
-    # Dividir se muito longo
-    MAX_LENGTH = 4000
-    if len(message) <= MAX_LENGTH:
-        return send_whatsapp_message(message)
 
-    # Dividir em partes
-    parts = []
-    current = ""
-    for line in message.split("\n"):
-        if len(current) + len(line) + 1 > MAX_LENGTH:
-            parts.append(current)
-            current = line
-        else:
-            current += "\n" + line if current else line
-    if current:
-        parts.append(current)
-
-    success = True
-    for i, part in enumerate(parts):
-        if i > 0:
-            part = f"📋 *Continuação ({i+1}/{len(parts)})*\n\n{part}"
-        if not send_whatsapp_message(part):
-            success = False
-
-    return success
+async def send_report_async(
+    licitacoes: list[dict],
+    boletim_number: int | None = None,
+    total_no_boletim: int | None = None,
+) -> bool:
+    """
+    Versão assíncrona de send_report, usada pelo pipeline.
+    As partes saem em sequência sobre a mesma conexão: a numeração "Continuação (i/n)"
+    só faz sentido se chegarem na ordem, o que envios simultâneos não garantem.
+    """
+    message = format_report(licitacoes, boletim_number, total_no_boletim=total_no_boletim)
+    results = [await send_whatsapp_message_async(part) for part in _split_message(message)]
+    return all(results)